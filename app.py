@@ -1,9 +1,50 @@
 import streamlit as st
-import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
 from pathlib import Path
+from contextlib import contextmanager
+from datetime import date, datetime
+from fractions import Fraction
+import functools
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import pickle
+import queue
+import re
 import shutil
-import numpy as np
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+
+_PERF_T0 = time.perf_counter()
+
+
+class _LazyModule:
+    """Module importé au premier accès à un de ses attributs.
+    pandas / numpy ne sont chargés que par les pages qui s'en servent :
+    la page Lifestyle (page d'entrée) démarre sans les importer.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = _LazyModule("pandas")
+np = _LazyModule("numpy")
+
+LOGGER = logging.getLogger("empereur")
 
 # ======================
 # CONFIG
@@ -11,110 +52,231 @@ import numpy as np
 
 TEMPLATE_FILE = "Systeme_Entrainement_Empereur_ULTIME.xlsx"
 DATA_FILE = "empereur_data.xlsx"
+# Nombre max de points envoyés au navigateur par série de graphique
+MAX_CHART_POINTS = 400
+# Graphe de dérivation des max : {exercice: {exercice_source: ratio, ...}}
+DERIVATIONS_FILE = "derivations.json"
+# Registre des exercices : catégorie, feuille, mode de saisie et rôle (métriques)
+EXERCISES_FILE = "exercises.json"
+# Caches binaires persistés entre process (matrice des séances, ...)
+CACHE_DIR = ".empereur_cache"
+# Progression proposée sur les pages de séance (pas de charge / de durée)
+PROGRESSION_KG_STEP = 2.5
+PROGRESSION_SEC_STEP = 5
+# Classeurs d'autres athlètes (un .xlsx par athlète) pour exports et classements
+ATHLETES_DIR = "athletes"
+# Athlètes affichés par classement (page Classements)
+LEADERBOARD_SIZE = 10
+# Saisons archivées hors du classeur actif (Parquet, une archive par saison et feuille)
+ARCHIVE_DIR = "archives"
+# Instantanés du classeur pris à chaque sauvegarde (blocs de lignes dédupliqués)
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_CHUNK_ROWS = 64
+# Valeurs aberrantes : une saisie est signalée à plus de OUTLIER_Z écarts-types
+# de la moyenne de l'exercice, dès OUTLIER_MIN_COUNT saisies ; écart-type au
+# moins OUTLIER_SD_FLOOR x la moyenne (historique de valeurs identiques).
+OUTLIER_Z = 4.0
+OUTLIER_MIN_COUNT = 5
+OUTLIER_SD_FLOOR = 0.1
+# Taille max du cache de résultats partagé entre répliques (LRU au-delà)
+RESULT_CACHE_MAX_MB = 64
+# Version du format des caches persistés (matrice, résultats) : à incrémenter
+# quand il change, pour ne pas relire ceux écrits par une version précédente.
+CACHE_SCHEMA = 3
+# Projection Monte Carlo de la fatigue (page Planning) : trajectoires simulées,
+# séances/semaine par défaut, volume relatif par niveau "Volume Cible" du
+# Mésocycle-Type (% de la charge de séance habituelle) et perte de readiness
+# par point d'ACWR (charge aiguë 7 j / chronique 28 j) au-delà de 1.
+PROJECTION_RUNS = 2000
+PROJECTION_SESSIONS_PER_WEEK = 4
+PROJECTION_VOLUME = {"High": 115, "Medium": 100, "Low": 60}
+PROJECTION_ACWR_PENALTY = 50.0
+# Auto-Mésocycle (prescriptions) : reps par série selon le "Volume Cible" et RPE
+# selon l'"Intensité Cible" des semaines du Mésocycle-Type, RPE décalé selon le
+# type de mésocycle du mois dans le Plan Annuel.
+MESO_REPS = {"High": 8, "Medium": 5, "Low": 3}
+MESO_RPE = {"High": 9, "Medium": 8, "Low": 6}
+MESO_MONTH_RPE_SHIFT = {"Peak": 1, "Deload": -2}
+# Noms des mois du Plan Annuel (colonne Mois), janvier = 1
+MONTHS_FR = ("janvier", "février", "mars", "avril", "mai", "juin", "juillet",
+             "août", "septembre", "octobre", "novembre", "décembre")
 
 # ======================
-# EXERCICES (doivent matcher l'Excel V3)
+# EXERCICES : REGISTRE (doit matcher l'Excel V3)
 # ======================
 
-LEGS_EXOS = [
-    "Front Squat (wedge)",
-    "Back Squat",
-    "Snatch Grip Deadlift (position haute)",
-    "Bulgarian Split Squat haltères",
-    "Hack Squat",
-    "Leg Press",
-    "Leg Extension (full stretch)",
-    "Leg Curl allongé",
-    "Leg Curl assis",
-    "Mollets debout",
-    "Mollets assis",
-    "Belt Squat",
-    "Romanian Deadlift (barre)",
-    "Hip Thrust barre",
-    "Cable Kickback",
-    "Abduction machine",
-    "Standing Hip Abduction",
-]
+# Champs saisis (séances et examens RPE) et unité RPE_EXAM de chaque mode
+MODE_FIELDS = {
+    "kg_reps": ("kg", "reps"),
+    "kg_only": ("kg",),
+    "reps_only": ("reps",),
+    "sec_only": ("sec",),
+}
+MODE_UNITS = {"kg_reps": "kg", "kg_only": "kg", "reps_only": "reps", "sec_only": "sec"}
+
+
+def build_exercise_registry(raw):
+    """Compile la config EXERCISES_FILE
+    {catégorie: {"sheet", "exercises": {exercice: {"mode", "role"}}}} (mode par
+    défaut kg_reps) en tables de correspondance prêtes à l'emploi :
+    - categories : {catégorie: {"sheet", "exercises": [exercices]}} ; l'ordre
+      des catégories donne le code "Bloc" du tableau des séances
+    - exercises : {exercice: {"category", "sheet", "mode", "unit", "fields",
+      "columns": {champ: colonne des feuilles de séance}}}
+    - columns : {colonne: (exercice, champ)} pour toutes les feuilles
+    - roles : {rôle: [exercices]}, exercices de référence des métriques (SAH...)
+    Lève ValueError sur un mode inconnu ou un exercice déclaré deux fois.
+    """
+    registry = {"categories": {}, "exercises": {}, "columns": {}, "roles": {}}
+    for category, spec in raw.items():
+        names = list(spec["exercises"])
+        registry["categories"][category] = {"sheet": spec["sheet"], "exercises": names}
+        for ex, meta in spec["exercises"].items():
+            mode = meta.get("mode", "kg_reps")
+            if mode not in MODE_FIELDS:
+                raise ValueError(f"{EXERCISES_FILE} : mode inconnu {mode!r} pour {ex!r}")
+            if ex in registry["exercises"]:
+                raise ValueError(f"{EXERCISES_FILE} : exercice {ex!r} déclaré deux fois")
+            columns = {field: f"{ex} ({field})" for field in MODE_FIELDS[mode]}
+            registry["exercises"][ex] = {
+                "category": category,
+                "sheet": spec["sheet"],
+                "mode": mode,
+                "unit": MODE_UNITS[mode],
+                "fields": MODE_FIELDS[mode],
+                "columns": columns,
+            }
+            for field, column in columns.items():
+                registry["columns"][column] = (ex, field)
+            if meta.get("role"):
+                registry["roles"].setdefault(meta["role"], []).append(ex)
+    return registry
+
+
+@st.cache_resource
+def exercise_registry():
+    """Registre des exercices, lu et compilé une fois par process."""
+    with open(EXERCISES_FILE, encoding="utf-8") as f:
+        return build_exercise_registry(json.load(f))
+
+
+EXERCISES = exercise_registry()
+# Feuilles de séance par catégorie (l'ordre donne le code "Bloc" du tableau des séances)
+SESSION_SHEETS = {category: spec["sheet"] for category, spec in EXERCISES["categories"].items()}
 
-PUSH_EXOS = [
-    "Développé couché barre / haltères",
-    "Développé militaire barre / haltères",
-    "Développé incliné batte / haltères",
-    "Développé Arnold",
-    "Kickbacks triceps",
-    "Pompes",
-    "Pompes lestées",
-    "Pompes diamants",
-    "Dips",
-    "Dips lestées",
-    "Chest-to-wall Hold",
-    "Handstand Hold",
-    "Pike push-up",
-    "HSPU Négative",
-    "HSPU partiels (mur)",
-    "HSPU",
-    "HSPU lestés",
-    "Écarté incliné à la poulie",
-    "Élévations latérales",
-    "Extension triceps poulie",
-]
 
-PULL_EXOS = [
-    "Tractions",
-    "Tractions lestées",
-    "Muscle-up",
-    "Muscles-up lestées",
-    "Rowing barre pronation",
-    "Rowing machine unilatérale",
-    "Good Morning barre basse",
-    "Tirage vertical poulie inversée",
-    "Curl biceps haltères",
-    "Curl marteau haltères",
-    "Face Pulls",
-    "Shrugs lourds",
-    "OMAD",  # Oiseau machine arrière d’épaules
-]
+# ======================
+# INSTRUMENTATION
+# ======================
+
+@st.cache_resource
+def _perf_store():
+    """Statistiques cumulées du process : {nom: {"calls", "total_ms", "max_ms"}}."""
+    return {}
 
-FULL_EXOS = [
-    "Box Jump",
-    "Tuck Jumps",
-    "Pistol Squat D",
-    "Pistol Squat G",
-    "Step-up genou haut D",
-    "Step-up genou haut G",
-    "High knees explosifs D",
-    "High knees explosifs G",
-    "Farmer Walk lourd",
-    "Burpees",
-    "Développé militaire au poids du corps",
-    "Dips coréen",
-    "Pompes inclinées pieds surélevés",
-]
 
-# Modes pour les pages de séance (kg/reps/sec)
-LEGS_MODES = {ex: "kg_reps" for ex in LEGS_EXOS}
+# Spans du rerun courant (le script est ré-exécuté, donc remis à zéro, à chaque rerun).
+# Ceux du worker d'analyses ne comptent que dans les stats cumulées.
+_PERF_RUN = []
+ANALYTICS_THREAD = "empereur-analytics"
+
+
+@contextmanager
+def perf_span(name):
+    """Chronomètre un bloc : ajouté à la trace du rerun et aux stats cumulées."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        if threading.current_thread().name != ANALYTICS_THREAD:
+            _PERF_RUN.append({"name": name,
+                              "start_ms": round((t0 - _PERF_T0) * 1000.0, 2),
+                              "ms": round(ms, 2)})
+        with store_lock():
+            stat = _perf_store().setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stat["calls"] += 1
+            stat["total_ms"] += ms
+            stat["max_ms"] = max(stat["max_ms"], ms)
+
+
+def timed(fn):
+    """Décorateur : temps et nombre d'appels de fn (voir perf_span)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with perf_span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def perf_trace(page):
+    """Trace JSON exportable : spans du rerun + stats cumulées du process."""
+    with store_lock():
+        cumul = {name: {"calls": v["calls"],
+                        "total_ms": round(v["total_ms"], 2),
+                        "mean_ms": round(v["total_ms"] / v["calls"], 2) if v["calls"] else 0.0,
+                        "max_ms": round(v["max_ms"], 2)}
+                 for name, v in _perf_store().items()}
+    return {"page": page, "rerun": list(_PERF_RUN), "cumulative": cumul,
+            "profile": st.session_state.get("perf_profile_text")}
+
+
+def _markdown_table(headers, rows):
+    """Petit tableau markdown (évite d'importer pandas pour le panneau)."""
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines += ["| " + " | ".join(str(v) for v in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def perf_panel(page):
+    """Panneau sidebar : temps du rerun, stats cumulées, profil cProfile, export JSON."""
+    trace = perf_trace(page)
+    with st.sidebar.expander("⏱️ Performance"):
+        if trace["rerun"]:
+            st.caption("Ce rerun")
+            st.markdown(_markdown_table(
+                ["Appel", "Début (ms)", "Durée (ms)"],
+                [(e["name"], e["start_ms"], e["ms"]) for e in trace["rerun"]]))
+        if trace["cumulative"]:
+            st.caption("Cumul du process")
+            top = sorted(trace["cumulative"].items(), key=lambda kv: -kv[1]["total_ms"])
+            st.markdown(_markdown_table(
+                ["Appel", "Appels", "Total (ms)", "Moy. (ms)", "Max (ms)"],
+                [(name, v["calls"], v["total_ms"], v["mean_ms"], v["max_ms"]) for name, v in top]))
+        if trace["profile"]:
+            st.caption("cProfile (dernier rerun profilé)")
+            st.code(trace["profile"])
+        st.download_button(
+            label="📥 Trace JSON",
+            data=json.dumps(trace, ensure_ascii=False, indent=2),
+            file_name="empereur_trace.json",
+            mime="application/json",
+        )
 
-PUSH_MODES = {ex: "kg_reps" for ex in PUSH_EXOS}
-for ex in ["Pompes", "Pompes diamants", "Dips", "Pike push-up",
-           "HSPU Négative", "HSPU partiels (mur)", "HSPU"]:
-    PUSH_MODES[ex] = "reps_only"
-PUSH_MODES["Chest-to-wall Hold"] = "sec_only"
-PUSH_MODES["Handstand Hold"] = "sec_only"
 
-PULL_MODES = {ex: "kg_reps" for ex in PULL_EXOS}
-for ex in ["Tractions", "Muscle-up"]:
-    PULL_MODES[ex] = "reps_only"
+def run_profiled(fn):
+    """Exécute fn sous cProfile et garde le top 25 (temps cumulé) en session."""
+    import cProfile
+    import io
+    import pstats
 
-FULL_MODES = {ex: "kg_reps" for ex in FULL_EXOS}
-FULL_MODES["Farmer Walk lourd"] = "kg_only"
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        fn()
+    finally:
+        prof.disable()
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(25)
+        st.session_state["perf_profile_text"] = buf.getvalue()
 
 
 # ======================
 # FICHIERS
 # ======================
 
-def get_excel_file(data_only=False):
-    """Utilise une copie DATA_FILE modifiable.
+def ensure_data_file():
+    """Retourne le chemin de la copie DATA_FILE modifiable, sans l'ouvrir.
     Si absente, on la crée à partir du TEMPLATE_FILE.
     """
     template_path = Path(TEMPLATE_FILE)
@@ -125,11 +287,337 @@ def get_excel_file(data_only=False):
     data_path = Path(DATA_FILE)
     if not data_path.exists():
         shutil.copy(template_path, data_path)
+    return data_path
+
 
+@timed
+def get_excel_file(data_only=False):
+    """Utilise une copie DATA_FILE modifiable.
+    Si absente, on la crée à partir du TEMPLATE_FILE.
+    """
+    data_path = ensure_data_file()
     wb = load_workbook(data_path, data_only=data_only)
     return wb, data_path
 
 
+@timed
+def save_workbook(wb, data_path, label="Sauvegarde"):
+    """Sauvegarde atomique : écrit un fichier temporaire puis le substitue, pour
+    que les lectures concurrentes (worker, autres sessions) ne voient jamais un
+    classeur à moitié écrit. Chaque sauvegarde enregistre un instantané `label`.
+    """
+    data_path = Path(data_path)
+    tmp_path = data_path.with_name(data_path.name + ".tmp")
+    wb.save(tmp_path)
+    os.replace(tmp_path, data_path)
+    # données déjà en place : un instantané manqué est journalisé, sans faire
+    # échouer la saisie ni priver le worker de sa notification
+    try:
+        take_snapshot(wb, data_path, label)
+    except Exception:
+        LOGGER.exception("Instantané « %s » non enregistré pour %s", label, data_path)
+
+
+def data_fingerprint(data_path):
+    """Empreinte du fichier de données (taille + mtime ns) : change à chaque
+    sauvegarde, puisque save_workbook remplace le fichier. Préfixée par
+    CACHE_SCHEMA pour invalider les caches d'un ancien format.
+    """
+    stat = Path(data_path).stat()
+    return f"v{CACHE_SCHEMA}-{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def read_excel_sheet(data_path, sheet_name):
+    """pd.read_excel d'une feuille, chronométré par feuille."""
+    with perf_span(f"read_excel[{sheet_name}]"):
+        return pd.read_excel(data_path, sheet_name=sheet_name)
+
+
+@st.cache_resource
+def workbook_lock():
+    """Verrou du process : une seule séquence lecture-modification-sauvegarde
+    du classeur à la fois (pages et worker d'analyses).
+    """
+    return threading.RLock()
+
+
+@st.cache_resource
+def store_lock():
+    """Verrou des magasins en mémoire (cache_resource) lus et modifiés à la fois
+    par les sessions et le worker d'analyses. Tenu le temps d'une lecture ou
+    d'une écriture, jamais pendant un calcul.
+    """
+    return threading.RLock()
+
+
+@contextmanager
+def edit_workbook(label="Sauvegarde"):
+    """Ouvre DATA_FILE sous verrou pour modification et le sauvegarde en sortie
+    (sauf exception), puis prévient le worker d'analyses.
+    """
+    with workbook_lock():
+        wb, data_path = get_excel_file()
+        yield wb, data_path
+        save_workbook(wb, data_path, label)
+    analytics_worker().notify(data_path)
+
+
+@st.cache_data(show_spinner=False)
+@timed
+def get_sheet_headers(data_path: str, sheet_name: str):
+    """Map {en-tête: n° de colonne} de la ligne 1 d'une feuille (None si absente).
+    Mis en cache : les en-têtes ne changent pas d'une saisie à l'autre.
+    """
+    wb = load_workbook(data_path, read_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            return None
+        first = next(wb[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True), ())
+        return {v: c for c, v in enumerate(first, start=1) if v is not None}
+    finally:
+        wb.close()
+
+
+# ======================
+# CACHE DE RÉSULTATS PARTAGÉ ENTRE PROCESS
+# ======================
+
+def athlete_id(data_path):
+    """Identifiant d'athlète d'un fichier de données : son chemin relatif au
+    dossier de l'app, sans extension ("empereur_data", "athletes/alice"). Deux
+    classeurs de même nom dans des dossiers différents ne partagent donc ni
+    cache, ni instantanés, ni archives. Hors du dossier de l'app : nom du
+    fichier + empreinte de son chemin.
+    """
+    path = Path(data_path).resolve()
+    try:
+        return path.relative_to(Path.cwd().resolve()).with_suffix("").as_posix()
+    except ValueError:
+        return f"{path.stem}-{hashlib.sha1(str(path).encode()).hexdigest()[:8]}"
+
+
+def list_athletes():
+    """{athlète: fichier} : l'athlète actif (DATA_FILE) puis les classeurs de ATHLETES_DIR."""
+    athletes = {}
+    data_path = Path(DATA_FILE)
+    if data_path.exists():
+        athletes[athlete_id(data_path)] = data_path
+    folder = Path(ATHLETES_DIR)
+    if folder.is_dir():
+        for path in sorted(folder.glob("*.xlsx")):
+            athletes[athlete_id(path)] = path
+    return athletes
+
+
+class SharedResultCache:
+    """Résultats picklés dans une base SQLite de CACHE_DIR, partagée par toutes
+    les répliques de la machine. Clé : (athlète, fonction, empreinte du fichier).
+    Au-delà de max_bytes, les entrées les moins récemment lues sont évincées.
+    La même base tient l'index des classements : meilleures valeurs par
+    (métrique, athlète), indexées par valeur décroissante pour lire un top-k.
+    Toute erreur de la base est traitée comme un défaut de cache.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " athlete TEXT, func TEXT, fingerprint TEXT, value BLOB,"
+                " size INTEGER, accessed REAL,"
+                " PRIMARY KEY (athlete, func, fingerprint))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leaderboard ("
+                " metric TEXT, athlete TEXT, value REAL, fingerprint TEXT,"
+                " PRIMARY KEY (metric, athlete))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (metric, value DESC)"
+            )
+            # une ligne par athlète indexé, même sans aucune métrique classable
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leaderboard_athletes ("
+                " athlete TEXT PRIMARY KEY, fingerprint TEXT)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, athlete, func, fingerprint):
+        """(trouvé, valeur)."""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM results WHERE athlete=? AND func=? AND fingerprint=?",
+                (athlete, func, fingerprint),
+            ).fetchone()
+            if row is None:
+                return False, None
+            conn.execute(
+                "UPDATE results SET accessed=? WHERE athlete=? AND func=? AND fingerprint=?",
+                (time.time(), athlete, func, fingerprint),
+            )
+            return True, pickle.loads(row[0])
+        except (sqlite3.Error, OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+
+    def put(self, athlete, func, fingerprint, value):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # les versions antérieures du fichier ne seront plus demandées
+                conn.execute(
+                    "DELETE FROM results WHERE athlete=? AND func=? AND fingerprint<>?",
+                    (athlete, func, fingerprint),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (athlete, func, fingerprint, blob, len(blob), time.time()),
+                )
+                conn.execute(
+                    "DELETE FROM results WHERE rowid IN ("
+                    " SELECT rowid FROM (SELECT rowid, SUM(size) OVER"
+                    " (ORDER BY accessed DESC, rowid DESC) AS total FROM results)"
+                    " WHERE total > ?)",
+                    (self.max_bytes,),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError, pickle.PicklingError):
+            pass
+
+    def rekey(self, athlete, func, fingerprint, new_fingerprint):
+        """Republie tel quel (sans le dépickler) le résultat d'une version du
+        fichier pour une nouvelle version. Retourne True si l'entrée existait.
+        """
+        try:
+            cur = self._connect().execute(
+                "UPDATE results SET fingerprint=?, accessed=?"
+                " WHERE athlete=? AND func=? AND fingerprint=?",
+                (new_fingerprint, time.time(), athlete, func, fingerprint),
+            )
+            return cur.rowcount > 0
+        except (sqlite3.Error, OSError):
+            return False
+
+    def put_bests(self, athlete, fingerprint, bests):
+        """Remplace les valeurs de classement de l'athlète ({métrique: valeur}) et
+        note la version de son fichier (même si bests est vide).
+        """
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leaderboard WHERE athlete=?", (athlete,))
+                conn.executemany(
+                    "INSERT INTO leaderboard VALUES (?, ?, ?, ?)",
+                    [(metric, athlete, value, fingerprint) for metric, value in bests.items()],
+                )
+                conn.execute("INSERT OR REPLACE INTO leaderboard_athletes VALUES (?, ?)",
+                             (athlete, fingerprint))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError):
+            pass
+
+    def drop_bests(self, athlete):
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leaderboard WHERE athlete=?", (athlete,))
+                conn.execute("DELETE FROM leaderboard_athletes WHERE athlete=?", (athlete,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError):
+            pass
+
+    def top(self, metric, k):
+        """[(athlète, valeur)] des k meilleures valeurs de la métrique, lues dans
+        l'index (metric, value DESC) : coût O(k), quel que soit le nombre d'athlètes.
+        """
+        try:
+            return self._connect().execute(
+                "SELECT athlete, value FROM leaderboard WHERE metric=?"
+                " ORDER BY value DESC LIMIT ?",
+                (metric, k),
+            ).fetchall()
+        except (sqlite3.Error, OSError):
+            return []
+
+    def bests_fingerprints(self):
+        """{athlète: empreinte du fichier d'où viennent ses valeurs de classement}."""
+        try:
+            return dict(self._connect().execute(
+                "SELECT athlete, fingerprint FROM leaderboard_athletes"
+            ).fetchall())
+        except (sqlite3.Error, OSError):
+            return {}
+
+    def bests_indexed(self):
+        """True si au moins un athlète a déjà été indexé (classements construits)."""
+        try:
+            return self._connect().execute(
+                "SELECT 1 FROM leaderboard_athletes LIMIT 1"
+            ).fetchone() is not None
+        except (sqlite3.Error, OSError):
+            return False
+
+
+@st.cache_resource
+def shared_cache():
+    """Cache de résultats partagé, un par process (connexion SQLite par thread)."""
+    return SharedResultCache(Path(CACHE_DIR) / "results.sqlite",
+                             RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+
+def shared_cached(fn):
+    """Décorateur pour fn(data_path, ...) : résultat servi par le cache partagé
+    pour la version courante du fichier, sinon calculé puis publié.
+    wrapper.publish(data_path, value) publie une valeur déjà calculée.
+    """
+    def cache_key(args, kwargs):
+        if not args and not kwargs:
+            return fn.__name__
+        return f"{fn.__name__}{args!r}{sorted(kwargs.items())!r}"
+
+    @functools.wraps(fn)
+    def wrapper(data_path, *args, **kwargs):
+        cache = shared_cache()
+        athlete, key = athlete_id(data_path), cache_key(args, kwargs)
+        fingerprint = data_fingerprint(data_path)
+        hit, value = cache.get(athlete, key, fingerprint)
+        if not hit:
+            value = fn(data_path, *args, **kwargs)
+            # fichier modifié pendant le calcul : ne pas publier sous l'ancienne empreinte
+            if data_fingerprint(data_path) == fingerprint:
+                cache.put(athlete, key, fingerprint, value)
+        return value
+
+    def publish(data_path, value, *args, **kwargs):
+        shared_cache().put(athlete_id(data_path), cache_key(args, kwargs),
+                           data_fingerprint(data_path), value)
+
+    wrapper.publish = publish
+    return wrapper
+
+
 # ======================
 # UTILITAIRES
 # ======================
@@ -159,6 +647,55 @@ def get_next_lifestyle_day(ws):
     return last + 1 if last > 0 else 1
 
 
+def ensure_column(ws, header):
+    """N° de colonne de l'en-tête `header` (ligne 1), ajouté en fin de ligne si absent."""
+    last = 0
+    for cell in ws[1]:
+        if cell.value == header:
+            return cell.column
+        if cell.value not in (None, ""):
+            last = cell.column
+    ws.cell(row=1, column=last + 1).value = header
+    return last + 1
+
+
+class TimeIndex:
+    """Index temporel trié d'une série de dates (lignes sans date ignorées).
+    Les requêtes par plage de dates sont des recherches dichotomiques
+    (np.searchsorted) : elles ne parcourent pas l'historique.
+    """
+
+    def __init__(self, dates):
+        days = (pd.to_datetime(pd.Series(dates), errors="coerce")
+                .to_numpy().astype("datetime64[D]"))
+        valid = ~np.isnat(days)
+        order = np.argsort(days[valid], kind="stable")
+        self.days = days[valid][order]
+        self.rows = np.flatnonzero(valid)[order]
+
+    def __len__(self):
+        return len(self.days)
+
+    @staticmethod
+    def _day(value):
+        return pd.Timestamp(value).to_datetime64().astype("datetime64[D]")
+
+    def between(self, start=None, end=None):
+        """Positions (ordre chronologique) des lignes datées de [start, end]."""
+        lo = 0 if start is None else np.searchsorted(self.days, self._day(start), side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, self._day(end), side="right")
+        return self.rows[lo:hi]
+
+    def last_days(self, days, end=None):
+        """Positions des lignes des `days` derniers jours calendaires jusqu'à `end`
+        inclus (par défaut : la date la plus récente de l'index).
+        """
+        if not len(self):
+            return self.rows
+        end = self.days[-1] if end is None else self._day(end)
+        return self.between(end - np.timedelta64(days - 1, "D"), end)
+
+
 def _to_float(series):
     return pd.to_numeric(series, errors="coerce")
 
@@ -167,6 +704,594 @@ def epley(kg, reps):
     return kg * (1 + reps / 30.0)
 
 
+# ======================
+# FORMULES EXCEL
+# ======================
+# openpyxl ne recalcule pas les formules : après un wb.save, les cellules
+# formules n'ont plus de valeur en cache (None / NaN côté pandas).
+# Mini-moteur pour le sous-ensemble de fonctions utilisé par le modèle.
+
+class ExcelError:
+    """Valeur d'erreur Excel (#DIV/0!, #REF!, ...), propagée comme en Excel."""
+
+    def __init__(self, code):
+        self.code = code
+
+    def __repr__(self):
+        return self.code
+
+
+_SHEET_PREFIX = r"(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w\.]*)!)?"
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+    (?P<string>"(?:[^"]|"")*")
+    |(?P<func>[A-Z][A-Z0-9\.]*)\(
+    |(?P<ref>{p}\$?[A-Z]{{1,3}}\$?\d+(?::{p}\$?[A-Z]{{1,3}}\$?\d+)?)
+    |(?P<colref>{p}\$?[A-Z]{{1,3}}:\$?[A-Z]{{1,3}})
+    |(?P<bool>TRUE|FALSE)\b
+    |(?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+    |(?P<op><>|<=|>=|[-+*/^&=<>(),%])
+    )""".format(p=_SHEET_PREFIX),
+    re.X,
+)
+_CELL_RE = re.compile(r"(?:(.+)!)?(\$?)([A-Z]{1,3})(\$?)(\d*)$")
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _parse_cell(text, sheet, row, col):
+    """'Feuille'!$B2 -> (feuille, (ligne, absolue), (colonne, absolue)), relatif à la cellule."""
+    m = _CELL_RE.match(text)
+    ref_sheet, col_abs, letters, row_abs, digits = m.groups()
+    if ref_sheet:
+        sheet = ref_sheet.strip("'").replace("''", "'")
+    c = _col_index(letters)
+    c_ref = (c, True) if col_abs else (c - col, False)
+    if digits == "":
+        r_ref = None
+    else:
+        r = int(digits)
+        r_ref = (r, True) if row_abs else (r - row, False)
+    return sheet, r_ref, c_ref
+
+
+def tokenize_formula(formula, sheet, row, col):
+    """Découpe une formule en tokens. Les références sont relatives à la cellule :
+    toutes les formules d'une colonne "tirée" donnent les mêmes tokens.
+    """
+    tokens = []
+    pos = 0
+    text = formula[1:] if formula.startswith("=") else formula
+    while pos < len(text):
+        if text[pos:].strip() == "":
+            break
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise ValueError(f"Formule non supportée : {formula}")
+        pos = m.end()
+        kind = m.lastgroup
+        val = m.group(kind)
+        if kind == "string":
+            tokens.append(("str", val[1:-1].replace('""', '"')))
+        elif kind == "func":
+            tokens.append(("func", val))
+        elif kind in ("ref", "colref"):
+            start, _, end = val.partition(":")
+            first = _parse_cell(start, sheet, row, col)
+            last = _parse_cell(end, first[0], row, col) if end else first
+            if kind == "colref":
+                last = _parse_cell(f"{first[0]}!{end}", first[0], row, col)
+            tokens.append(("ref", first[0], first[1], first[2], last[1], last[2], bool(end)))
+        elif kind == "bool":
+            tokens.append(("bool", val == "TRUE"))
+        elif kind == "number":
+            tokens.append(("num", float(val)))
+        else:
+            tokens.append(("op", val))
+    return tuple(tokens)
+
+
+class _FormulaParser:
+    """Descente récursive : comparaison < & < + - < * / < ^ < unaire < %."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ("end",)
+
+    def take(self):
+        tok = self.peek()
+        self.pos += 1
+        return tok
+
+    def is_op(self, *ops):
+        tok = self.peek()
+        return tok[0] == "op" and tok[1] in ops
+
+    def parse(self):
+        node = self.compare()
+        if self.peek()[0] != "end":
+            raise ValueError(f"Token inattendu : {self.peek()}")
+        return node
+
+    def binary(self, sub, ops):
+        node = sub()
+        while self.is_op(*ops):
+            op = self.take()[1]
+            node = ("bin", op, node, sub())
+        return node
+
+    def compare(self):
+        return self.binary(self.concat, ("=", "<>", "<", ">", "<=", ">="))
+
+    def concat(self):
+        return self.binary(self.add, ("&",))
+
+    def add(self):
+        return self.binary(self.mul, ("+", "-"))
+
+    def mul(self):
+        return self.binary(self.power, ("*", "/"))
+
+    def power(self):
+        return self.binary(self.unary, ("^",))
+
+    def unary(self):
+        if self.is_op("-"):
+            self.take()
+            return ("neg", self.unary())
+        if self.is_op("+"):
+            self.take()
+            return self.unary()
+        node = self.primary()
+        while self.is_op("%"):
+            self.take()
+            node = ("bin", "/", node, ("num", 100.0))
+        return node
+
+    def primary(self):
+        tok = self.take()
+        if tok[0] in ("num", "str", "bool", "ref"):
+            return tok
+        if tok[0] == "func":
+            args = []
+            if self.is_op(")"):
+                self.take()
+                return ("call", tok[1], args)
+            while True:
+                if self.is_op(",", ")"):
+                    args.append(("empty",))
+                else:
+                    args.append(self.compare())
+                sep = self.take()
+                if sep == ("op", ")"):
+                    return ("call", tok[1], args)
+                if sep != ("op", ","):
+                    raise ValueError(f"',' ou ')' attendu, reçu {sep}")
+        if tok == ("op", "("):
+            node = self.compare()
+            if self.take() != ("op", ")"):
+                raise ValueError("')' attendue")
+            return node
+        raise ValueError(f"Token inattendu : {tok}")
+
+
+class _Range:
+    """Plage évaluée : liste de lignes de valeurs + coordonnées de départ."""
+
+    def __init__(self, rows, row0, col0):
+        self.rows = rows
+        self.row0 = row0
+        self.col0 = col0
+
+    def values(self):
+        return [v for line in self.rows for v in line]
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _to_number(v):
+    if isinstance(v, ExcelError):
+        return v
+    if v is None:
+        return 0.0
+    if isinstance(v, bool):
+        return float(v)
+    if _is_number(v):
+        return float(v)
+    if isinstance(v, date):
+        # numéro de série Excel (jours depuis le 30/12/1899)
+        if not isinstance(v, datetime):
+            v = datetime(v.year, v.month, v.day)
+        return (v - datetime(1899, 12, 30)).total_seconds() / 86400
+    try:
+        return float(str(v).strip())
+    except ValueError:
+        return ExcelError("#VALUE!")
+
+
+def _to_text(v):
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _compare(op, a, b):
+    if a is None:
+        a = "" if isinstance(b, str) else 0.0
+    if b is None:
+        b = "" if isinstance(a, str) else 0.0
+    if isinstance(a, str) and isinstance(b, str):
+        a, b = a.lower(), b.lower()
+    elif isinstance(a, str) != isinstance(b, str):
+        # Excel : tout nombre est "plus petit" qu'un texte
+        a, b = (1, 0) if isinstance(a, str) else (0, 1)
+    return {"=": a == b, "<>": a != b, "<": a < b, ">": a > b,
+            "<=": a <= b, ">=": a >= b}[op]
+
+
+def _excel_round(x, digits):
+    factor = 10 ** int(digits)
+    return math.copysign(math.floor(abs(x) * factor + 0.5) / factor, x)
+
+
+def _criteria_matcher(crit):
+    """Critère AVERAGEIF : valeur exacte ou ">5", "<>Force", ..."""
+    if isinstance(crit, str):
+        m = re.match(r"(<>|<=|>=|<|>|=)?(.*)$", crit)
+        op, rest = m.group(1) or "=", m.group(2)
+        num = _to_number(rest)
+        target = rest if isinstance(num, ExcelError) else num
+        return lambda v: v is not None and _compare(op, v, target)
+    return lambda v: v is not None and _compare("=", v, crit)
+
+
+class FormulaEvaluator:
+    """Évalue les formules d'un classeur openpyxl (ouvert avec les formules).
+    Les formules sont compilées une fois par forme (références relatives) : une
+    colonne de formules tirées partage un seul arbre. Les valeurs sont mémoïsées.
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self._cells = {}
+        self._bounds = {}
+        self._memo = {}
+        self._ast_cache = {}
+
+    def _sheet_cells(self, sheet):
+        if sheet not in self._cells:
+            if sheet not in self.wb.sheetnames:
+                return None
+            ws = self.wb[sheet]
+            self._cells[sheet] = {(c.row, c.column): c.value
+                                  for line in ws.iter_rows() for c in line
+                                  if c.value is not None}
+            self._bounds[sheet] = (ws.max_row, ws.max_column)
+        return self._cells[sheet]
+
+    def value(self, sheet, row, col):
+        cells = self._sheet_cells(sheet)
+        if cells is None:
+            return ExcelError("#REF!")
+        raw = cells.get((row, col))
+        if not (isinstance(raw, str) and raw.startswith("=")):
+            return raw if isinstance(raw, (str, int, float, bool, date)) or raw is None else None
+        key = (sheet, row, col)
+        if key not in self._memo:
+            self._memo[key] = ExcelError("#CIRC!")
+            self._memo[key] = self._evaluate_formula(raw, sheet, row, col)
+        return self._memo[key]
+
+    def _evaluate_formula(self, formula, sheet, row, col):
+        try:
+            tokens = tokenize_formula(formula, sheet, row, col)
+            ast = self._ast_cache.get(tokens)
+            if ast is None:
+                ast = self._ast_cache[tokens] = _FormulaParser(tokens).parse()
+            result = self._eval(ast, sheet, row, col)
+        except (ValueError, ZeroDivisionError, OverflowError, IndexError):
+            return ExcelError("#VALUE!")
+        if isinstance(result, _Range):
+            vals = result.values()
+            result = vals[0] if len(vals) == 1 else ExcelError("#VALUE!")
+        return result
+
+    def sheet_frame(self, sheet):
+        """DataFrame d'une feuille (en-têtes en ligne 1), formules calculées,
+        erreurs remplacées par NaN. Lève KeyError si la feuille n'existe pas.
+        """
+        cells = self._sheet_cells(sheet)
+        if cells is None:
+            raise KeyError(f"Worksheet named '{sheet}' not found")
+        max_row, max_col = self._bounds[sheet]
+        header = [self.value(sheet, 1, c) for c in range(1, max_col + 1)]
+        columns = [h if h is not None and not isinstance(h, ExcelError) else f"Unnamed: {i}"
+                   for i, h in enumerate(header)]
+        rows = []
+        for r in range(2, max_row + 1):
+            line = [self.value(sheet, r, c) for c in range(1, max_col + 1)]
+            rows.append([None if isinstance(v, ExcelError) else v for v in line])
+        while rows and all(v is None for v in rows[-1]):
+            rows.pop()
+        return pd.DataFrame(rows, columns=columns).infer_objects()
+
+    # --- évaluation de l'arbre ---
+
+    def _ref(self, node, row, col):
+        _, sheet, r1, c1, r2, c2, is_range = node
+        col1 = c1[0] if c1[1] else col + c1[0]
+        col2 = c2[0] if c2[1] else col + c2[0]
+        if r1 is None:  # colonne entière (B:B)
+            cells = self._sheet_cells(sheet)
+            if cells is None:
+                return ExcelError("#REF!")
+            row1, row2 = 1, self._bounds[sheet][0]
+        else:
+            row1 = r1[0] if r1[1] else row + r1[0]
+            row2 = r2[0] if r2[1] else row + r2[0]
+        if not is_range:
+            return self.value(sheet, row1, col1)
+        if self._sheet_cells(sheet) is None:
+            return ExcelError("#REF!")
+        row1, row2 = min(row1, row2), max(row1, row2)
+        col1, col2 = min(col1, col2), max(col1, col2)
+        return _Range([[self.value(sheet, r, c) for c in range(col1, col2 + 1)]
+                       for r in range(row1, row2 + 1)], row1, col1)
+
+    def _eval(self, node, sheet, row, col):
+        kind = node[0]
+        if kind in ("num", "str", "bool"):
+            return node[1]
+        if kind == "empty":
+            return None
+        if kind == "ref":
+            return self._ref(node, row, col)
+        if kind == "neg":
+            v = _to_number(self._scalar(node[1], sheet, row, col))
+            return v if isinstance(v, ExcelError) else -v
+        if kind == "bin":
+            return self._binary(node[1], self._scalar(node[2], sheet, row, col),
+                                self._scalar(node[3], sheet, row, col))
+        if kind == "call":
+            return self._call(node[1], node[2], sheet, row, col)
+        raise ValueError(f"Nœud inconnu : {kind}")
+
+    def _scalar(self, node, sheet, row, col):
+        v = self._eval(node, sheet, row, col)
+        if isinstance(v, _Range):
+            vals = v.values()
+            return vals[0] if len(vals) == 1 else ExcelError("#VALUE!")
+        return v
+
+    def _binary(self, op, a, b):
+        for v in (a, b):
+            if isinstance(v, ExcelError):
+                return v
+        if op == "&":
+            return _to_text(a) + _to_text(b)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            return _compare(op, a, b)
+        a, b = _to_number(a), _to_number(b)
+        for v in (a, b):
+            if isinstance(v, ExcelError):
+                return v
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            return ExcelError("#DIV/0!") if b == 0 else a / b
+        return a ** b
+
+    def _args(self, args, sheet, row, col):
+        return [self._eval(a, sheet, row, col) for a in args]
+
+    def _numbers(self, values):
+        """Nombres des arguments (dans les plages : seulement les vrais nombres)."""
+        out = []
+        for v in values:
+            if isinstance(v, _Range):
+                for x in v.values():
+                    if isinstance(x, ExcelError):
+                        return x
+                    if _is_number(x):
+                        out.append(float(x))
+            elif isinstance(v, ExcelError):
+                return v
+            elif v is not None:
+                x = _to_number(v)
+                if isinstance(x, ExcelError):
+                    return x
+                out.append(x)
+        return out
+
+    def _call(self, name, args, sheet, row, col):
+        def ev(i):
+            return self._scalar(args[i], sheet, row, col)
+
+        if name == "IF":
+            cond = ev(0)
+            if isinstance(cond, ExcelError):
+                return cond
+            cond = _to_number(cond) if not isinstance(cond, bool) else cond
+            if isinstance(cond, ExcelError):
+                return cond
+            if cond:
+                return ev(1) if len(args) > 1 else True
+            return ev(2) if len(args) > 2 else False
+        if name == "IFERROR":
+            v = ev(0)
+            return ev(1) if isinstance(v, ExcelError) else v
+        if name == "CHOOSE":
+            idx = _to_number(ev(0))
+            if isinstance(idx, ExcelError):
+                return idx
+            idx = int(idx)
+            if idx < 1 or idx >= len(args):
+                return ExcelError("#VALUE!")
+            return ev(idx)
+        if name == "ROW":
+            if not args:
+                return float(row)
+            ref = self._eval(args[0], sheet, row, col)
+            if isinstance(ref, _Range):
+                return float(ref.row0)
+            node = args[0]
+            return float(node[2][0] if node[2][1] else row + node[2][0])
+
+        values = self._args(args, sheet, row, col)
+        for v in values:
+            if isinstance(v, ExcelError):
+                return v
+
+        if name in ("SUM", "AVERAGE", "COUNT", "MAX", "MIN", "STDEV.P"):
+            nums = self._numbers(values)
+            if isinstance(nums, ExcelError):
+                return nums
+            if name == "SUM":
+                return float(sum(nums))
+            if name == "COUNT":
+                return float(len(nums))
+            if name in ("MAX", "MIN"):
+                return float((max if name == "MAX" else min)(nums)) if nums else 0.0
+            if not nums:
+                return ExcelError("#DIV/0!")
+            mean = sum(nums) / len(nums)
+            if name == "AVERAGE":
+                return mean
+            return math.sqrt(sum((x - mean) ** 2 for x in nums) / len(nums))
+        if name in ("AND", "OR"):
+            flags = []
+            for v in values:
+                items = v.values() if isinstance(v, _Range) else [v]
+                for x in items:
+                    if isinstance(x, ExcelError):
+                        return x
+                    if isinstance(x, bool) or _is_number(x):
+                        flags.append(bool(x))
+            if not flags:
+                return ExcelError("#VALUE!")
+            return all(flags) if name == "AND" else any(flags)
+        if name == "ROUND":
+            x, d = _to_number(values[0]), _to_number(values[1])
+            for v in (x, d):
+                if isinstance(v, ExcelError):
+                    return v
+            return _excel_round(x, d)
+        if name == "INDEX":
+            rng = values[0]
+            r = int(_to_number(values[1])) if len(values) > 1 else 1
+            c = int(_to_number(values[2])) if len(values) > 2 else 1
+            if not isinstance(rng, _Range):
+                return rng
+            if len(rng.rows) == 1 and len(values) == 2:
+                r, c = 1, r
+            try:
+                return rng.rows[r - 1][c - 1]
+            except IndexError:
+                return ExcelError("#REF!")
+        if name == "MATCH":
+            target, rng = values[0], values[1]
+            mode = int(_to_number(values[2])) if len(values) > 2 else 1
+            if isinstance(target, ExcelError):
+                return target
+            items = rng.values() if isinstance(rng, _Range) else [rng]
+            best = None
+            for i, x in enumerate(items, start=1):
+                if x is None or isinstance(x, ExcelError):
+                    continue
+                if mode == 0 and _compare("=", x, target):
+                    return float(i)
+                if mode == 1 and _compare("<=", x, target):
+                    best = i
+            return float(best) if best is not None else ExcelError("#N/A")
+        if name == "LOOKUP":
+            target = values[0]
+            items = values[1].values() if isinstance(values[1], _Range) else [values[1]]
+            found = ExcelError("#N/A")
+            for x in items:
+                if _is_number(x) and _is_number(target) and x <= target:
+                    found = x
+            return found
+        if name == "AVERAGEIF":
+            crit_rng, crit = values[0], values[1]
+            avg_rng = values[2] if len(values) > 2 else crit_rng
+            if not isinstance(crit_rng, _Range) or not isinstance(avg_rng, _Range):
+                return ExcelError("#VALUE!")
+            match = _criteria_matcher(crit)
+            nums = [float(v) for k, v in zip(crit_rng.values(), avg_rng.values())
+                    if match(k) and _is_number(v)]
+            return sum(nums) / len(nums) if nums else ExcelError("#DIV/0!")
+        if name in ("SLOPE", "FORECAST.LINEAR", "FORECAST"):
+            if name == "SLOPE":
+                ys, xs = values[0], values[1]
+            else:
+                x0, ys, xs = _to_number(values[0]), values[1], values[2]
+                if isinstance(x0, ExcelError):
+                    return x0
+            if not isinstance(xs, _Range) or not isinstance(ys, _Range):
+                return ExcelError("#VALUE!")
+            pairs = [(float(x), float(y)) for x, y in zip(xs.values(), ys.values())
+                     if _is_number(x) and _is_number(y)]
+            if len(pairs) < 2:
+                return ExcelError("#DIV/0!")
+            mx = sum(p[0] for p in pairs) / len(pairs)
+            my = sum(p[1] for p in pairs) / len(pairs)
+            sxx = sum((p[0] - mx) ** 2 for p in pairs)
+            if sxx == 0:
+                return ExcelError("#DIV/0!")
+            slope = sum((p[0] - mx) * (p[1] - my) for p in pairs) / sxx
+            return slope if name == "SLOPE" else my + slope * (x0 - mx)
+        return ExcelError("#NAME?")
+
+
+@st.cache_resource
+def _formula_store():
+    """Feuilles évaluées par fichier : {data_path: {"mtime", "evaluator", "frames"}}."""
+    return {}
+
+
+@timed
+def read_sheet_evaluated(data_path: Path, sheet_name: str):
+    """Équivalent de pd.read_excel(data_path, sheet_name=...) avec les formules
+    recalculées. Mis en cache jusqu'à la prochaine modification du fichier.
+    """
+    store = _formula_store()
+    key = str(data_path)
+    mtime = Path(data_path).stat().st_mtime
+    with store_lock():
+        entry = store.get(key)
+        if entry is None or entry["mtime"] != mtime:
+            entry = {"mtime": mtime, "evaluator": None, "frames": {}}
+            store[key] = entry
+        frame = entry["frames"].get(sheet_name)
+        evaluator = entry["evaluator"]
+    if frame is None:
+        if evaluator is None:
+            evaluator = FormulaEvaluator(load_workbook(data_path))
+        frame = evaluator.sheet_frame(sheet_name)
+        with store_lock():
+            entry["evaluator"] = entry["evaluator"] or evaluator
+            entry["frames"][sheet_name] = frame
+    return frame.copy()
+
+
 # ======================
 # LIFESTYLE
 # ======================
@@ -179,6 +1304,7 @@ def page_lifestyle():
 
     jour = get_next_lifestyle_day(ws)
     st.info(f"Jour enregistré : **{jour}** (prochain enregistrement)")
+    jour_date = st.date_input("Date", value=date.today())
 
     col1, col2 = st.columns(2)
     with col1:
@@ -192,88 +1318,233 @@ def page_lifestyle():
         humeur = st.number_input("Humeur (0-10)", 0.0, 10.0, 7.0, 0.5)
 
     if st.button("💾 Enregistrer Lifestyle"):
-        row = None
-        for r in range(2, ws.max_row + 2):
-            if ws.cell(row=r, column=1).value is None:
-                row = r
-                break
-        if row is None:
-            row = ws.max_row + 1
-
-        s = float(sommeil)
-        h = float(hydrat)
-        n = float(nutri)
-        stv = float(stress)
-        c = float(conc)
-        e = float(energie)
-        hm = float(humeur)
-
-        ws.cell(row=row, column=1).value = jour
-        ws.cell(row=row, column=2).value = s
-        ws.cell(row=row, column=3).value = h
-        ws.cell(row=row, column=4).value = n
-        ws.cell(row=row, column=5).value = stv
-        ws.cell(row=row, column=6).value = c
-        ws.cell(row=row, column=7).value = e
-        ws.cell(row=row, column=8).value = hm
-
-        if ws.cell(row=1, column=9).value in (None, ""):
-            ws.cell(row=1, column=9).value = "Readiness"
-
-        score_pos = (s + h + n + c + e + hm) / 6.0
-        score_stress = 10.0 - stv
-        readiness10 = 0.7 * score_pos + 0.3 * score_stress
-        readiness100 = round(readiness10 * 10)
-
-        ws.cell(row=row, column=9).value = readiness100
-
-        wb.save(data_path)
+        with workbook_lock():
+            with edit_workbook(f"Lifestyle jour {jour}") as (wb, data_path):
+                before_fingerprint = data_fingerprint(data_path)
+                ws = wb["Lifestyle"]
+                readiness100 = save_lifestyle_row(ws, jour, sommeil, hydrat, nutri,
+                                                  stress, conc, energie, humeur, jour_date)
+            carry_auto_mesocycle(data_path, before_fingerprint)
         st.success(f"Lifestyle jour {jour} enregistré. Readiness = {readiness100}/100")
 
 
+def save_lifestyle_row(ws, jour, sommeil, hydrat, nutri, stress, conc, energie, humeur,
+                       jour_date=None):
+    """Écrit une ligne Lifestyle (+ Readiness calculé et date) dans la feuille
+    ouverte. Retourne le Readiness sur 100.
+    """
+    row = None
+    for r in range(2, ws.max_row + 2):
+        if ws.cell(row=r, column=1).value is None:
+            row = r
+            break
+    if row is None:
+        row = ws.max_row + 1
+
+    s = float(sommeil)
+    h = float(hydrat)
+    n = float(nutri)
+    stv = float(stress)
+    c = float(conc)
+    e = float(energie)
+    hm = float(humeur)
+
+    ws.cell(row=row, column=1).value = jour
+    ws.cell(row=row, column=2).value = s
+    ws.cell(row=row, column=3).value = h
+    ws.cell(row=row, column=4).value = n
+    ws.cell(row=row, column=5).value = stv
+    ws.cell(row=row, column=6).value = c
+    ws.cell(row=row, column=7).value = e
+    ws.cell(row=row, column=8).value = hm
+
+    if ws.cell(row=1, column=9).value in (None, ""):
+        ws.cell(row=1, column=9).value = "Readiness"
+
+    score_pos = (s + h + n + c + e + hm) / 6.0
+    score_stress = 10.0 - stv
+    readiness10 = 0.7 * score_pos + 0.3 * score_stress
+    readiness100 = round(readiness10 * 10)
+
+    ws.cell(row=row, column=9).value = readiness100
+    if jour_date is not None:
+        ws.cell(row=row, column=ensure_column(ws, "Date")).value = jour_date
+
+    return readiness100
+
+
 # ======================
 # RPE EXAM & DB
 # ======================
 
-def rpe_from_max(val, unit):
-    """Retourne un dict {5: v5, ..., 10: v10} à partir d'une valeur max.
-    Pour les kg : pourcentages plus fins.
-    Pour reps/sec : proportion linéaire.
+RPE_LEVELS = list(range(5, 11))
+RPE_REPS = list(range(1, 11))
+RPE_DB_COLUMNS = ["Exercice", "Category", "Unit", "Reps"] + [f"RPE{r}" for r in RPE_LEVELS]
+
+# Table RTS : % du 1RM selon le nombre de reps "effectives"
+# (reps faites + reps en réserve). N reps à RPE R = N + (10 - R) reps effectives.
+RTS_PCT = [1.000, 0.955, 0.922, 0.892, 0.863, 0.837, 0.811, 0.786,
+           0.762, 0.739, 0.707, 0.680, 0.653, 0.626, 0.599]
+
+
+def rts_percentage(reps, rpe):
+    """% du 1RM (0-1) pour un nombre de reps à un RPE donné (style RTS), vectorisé.
+    Au-delà de la table, on prolonge la pente de fin de table (-2,7 % par rep).
     """
-    if val is None:
-        return {r: None for r in range(5, 11)}
+    eff = np.asarray(reps, dtype=float) + 10 - np.asarray(rpe, dtype=float)
+    last = len(RTS_PCT)
+    pct = np.interp(eff, np.arange(1, last + 1), RTS_PCT)
+    pct = np.where(eff > last, RTS_PCT[-1] - 0.027 * (eff - last), pct)
+    return np.clip(pct, 0.3, 1.0)
 
-    if unit == "kg":
-        factors = {
-            5: 0.80,
-            6: 0.86,
-            7: 0.90,
-            8: 0.94,
-            9: 0.97,
-            10: 1.00,
-        }
-        return {r: round(val * factors[r], 1) for r in range(5, 11)}
-    else:  # reps ou sec
-        factors = {
-            5: 0.50,
-            6: 0.60,
-            7: 0.70,
-            8: 0.80,
-            9: 0.90,
-            10: 1.00,
-        }
-        return {r: int(round(val * factors[r])) for r in range(5, 11)}
+
+def estimate_e1rm(kg, reps):
+    """e1RM à partir d'un test kg x reps (série menée à RPE 10), vectorisé.
+    Reps absentes ou < 1 : le test est considéré comme un single.
+    """
+    kg = np.asarray(kg, dtype=float)
+    reps = np.asarray(reps, dtype=float)
+    reps = np.where(np.isnan(reps) | (reps < 1), 1.0, reps)
+    return kg / rts_percentage(reps, 10)
+
+
+def build_rpe_table(df_max):
+    """Construit le tableau compact RPE_DATABASE pour tous les exercices d'un coup.
+    df_max : colonnes Exercice, Category, Unit, Max (e1RM pour les kg, max sinon).
+    kg : une ligne par nombre de reps (1-10), colonnes RPE5-RPE10 = e1RM x %RTS.
+    reps / sec : une seule ligne (Reps vide), proportion linéaire du max.
+    Exercice pas encore testé : une seule ligne vide.
+    """
+    rpe_cols = [f"RPE{r}" for r in RPE_LEVELS]
+    rpes = np.array(RPE_LEVELS, dtype=float)
+    vals = df_max["Max"].to_numpy(dtype=float)
+    is_kg = (df_max["Unit"] == "kg").to_numpy() & ~np.isnan(vals)
+    pos = np.arange(len(df_max))
+    meta = df_max[["Exercice", "Category", "Unit"]].reset_index(drop=True)
+
+    pct = rts_percentage(np.array(RPE_REPS, dtype=float)[:, None], rpes[None, :])
+    kg_loads = np.round(vals[is_kg, None, None] * pct[None, :, :], 1)
+    kg_part = meta.iloc[np.repeat(pos[is_kg], len(RPE_REPS))].copy()
+    kg_part["Reps"] = np.tile(RPE_REPS, int(is_kg.sum()))
+    kg_part[rpe_cols] = kg_loads.reshape(-1, len(RPE_LEVELS))
+
+    other_part = meta.iloc[pos[~is_kg]].copy()
+    other_part["Reps"] = None
+    other_part[rpe_cols] = np.round(vals[~is_kg, None] * (rpes / 10.0)[None, :])
+
+    df_db = pd.concat([kg_part, other_part]).sort_index(kind="stable")
+    return df_db[RPE_DB_COLUMNS].reset_index(drop=True)
+
+
+def load_derivations():
+    """Lit le graphe de dérivation (DERIVATIONS_FILE).
+    Format : {exercice: {exercice_source: ratio}} ; ratio en nombre ou fraction ("1/3").
+    Les sources sont essayées dans l'ordre, la première disponible est utilisée.
+    """
+    path = Path(DERIVATIONS_FILE)
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return {ex: {src: float(Fraction(str(ratio))) for src, ratio in sources.items()}
+            for ex, sources in raw.items()}
+
+
+def derivation_order(derivations):
+    """Ordre topologique (Kahn) des exercices dérivés. Lève ValueError si cycle."""
+    pending = {ex: {src for src in sources if src in derivations}
+               for ex, sources in derivations.items()}
+    order = []
+    ready = [ex for ex, deps in pending.items() if not deps]
+    while ready:
+        ex = ready.pop(0)
+        order.append(ex)
+        for other, deps in pending.items():
+            if ex in deps:
+                deps.discard(ex)
+                if not deps and other not in order and other not in ready:
+                    ready.append(other)
+    if len(order) != len(derivations):
+        raise ValueError(f"Cycle dans {DERIVATIONS_FILE} : {sorted(set(derivations) - set(order))}")
+    return order
+
+
+def downstream_of(derivations, changed):
+    """Exercices dérivés qui dépendent (directement ou non) d'un exercice modifié."""
+    dirty = set()
+    for ex in derivation_order(derivations):
+        if any(src in changed or src in dirty for src in derivations[ex]):
+            dirty.add(ex)
+    return dirty
+
+
+def resolve_derived_maxes(max_map, derivations, changed=None, memo=None):
+    """Complète max_map {ex: (unit, val)} avec les max dérivés, en ordre topologique.
+    Un exercice testé garde sa propre valeur ; sinon il est dérivé de sa source.
+    Avec memo (résultat précédent) et changed (exercices modifiés), seuls les
+    nœuds en aval des modifications sont recalculés.
+    """
+    resolved = dict(max_map)
+    dirty = None if memo is None or changed is None else downstream_of(derivations, changed)
+
+    for ex in derivation_order(derivations):
+        unit, own = resolved.get(ex, ("reps", None))
+        if own is not None:
+            continue
+        if dirty is not None and ex not in dirty and ex in memo:
+            resolved[ex] = memo[ex]
+            continue
+        for src, ratio in derivations[ex].items():
+            src_val = resolved.get(src, (None, None))[1]
+            if src_val is None:
+                continue
+            if unit == "kg":
+                resolved[ex] = (unit, round(src_val * ratio, 1))
+            else:
+                resolved[ex] = (unit, max(1, int(round(src_val * ratio))))
+            break
+    return resolved
+
+
+@st.cache_resource
+def _derived_memo_store():
+    """Dernière résolution par fichier de données :
+    {data_path: (max_map lu dans RPE_EXAM, graphe de dérivation, max_map résolu)}.
+    """
+    return {}
 
 
-def recompute_rpe_database(wb, data_path):
-    """Lit RPE_EXAM, applique la logique de calcul + propagation HSPU,
-    et écrit RPE_DATABASE.
+def derived_memo_for(cached, max_map, derivations, changed):
+    """Max_map résolu réutilisable pour une résolution partielle, ou None. Il ne
+    l'est que si RPE_EXAM n'a pas bougé hors de `changed` depuis (autre
+    réplique, édition dans Excel) et si le graphe est le même.
+    """
+    if cached is None or changed is None:
+        return None
+    sources, cached_derivations, resolved = cached
+    if cached_derivations != derivations:
+        return None
+    for ex in set(sources) | set(max_map):
+        if ex not in changed and sources.get(ex) != max_map.get(ex):
+            return None
+    return resolved
+
+
+@timed
+def recompute_rpe_database(wb, data_path, changed=None):
+    """Lit RPE_EXAM (dans le classeur ouvert), applique la logique de calcul + le
+    graphe de dérivation, et écrit RPE_DATABASE (matrice reps x RPE pour les kg).
+    Un seul wb.save : les modifications de RPE_EXAM en attente partent avec.
+    changed : exercices modifiés par l'examen (None = tout recalculer).
     """
-    df_exam = pd.read_excel(data_path, sheet_name="RPE_EXAM")
+    exam_rows = list(wb["RPE_EXAM"].values)
+    df_exam = pd.DataFrame(exam_rows[1:], columns=exam_rows[0])
+    df_exam = df_exam.dropna(subset=["Exercice"]).reset_index(drop=True)
+    e1rms = estimate_e1rm(_to_float(df_exam["Max_kg"]), _to_float(df_exam["Max_reps"]))
 
     max_map = {}
 
-    for _, row in df_exam.iterrows():
+    for i, row in df_exam.iterrows():
         ex = row["Exercice"]
         unit = row["Unit"]
         max_kg = row.get("Max_kg")
@@ -282,7 +1553,7 @@ def recompute_rpe_database(wb, data_path):
 
         val = None
         if unit == "kg" and pd.notna(max_kg):
-            val = float(max_kg)
+            val = float(e1rms[i])
         elif unit == "reps" and pd.notna(max_reps):
             val = float(max_reps)
         elif unit == "sec" and pd.notna(max_sec):
@@ -290,43 +1561,28 @@ def recompute_rpe_database(wb, data_path):
 
         max_map[ex] = (unit, val)
 
-    pike = max_map.get("Pike push-up", (None, None))[1]
-    hspu_neg_unit, hspu_neg_val = max_map.get("HSPU Négative", ("reps", None))
-    hspu_part_unit, hspu_part_val = max_map.get("HSPU partiels (mur)", ("reps", None))
-    hspu_unit, hspu_val = max_map.get("HSPU", ("reps", None))
-
-    if pike is not None and hspu_neg_val is None:
-        hspu_neg_val = max(1, int(round(pike / 3)))
-        max_map["HSPU Négative"] = ("reps", hspu_neg_val)
-
-    if hspu_neg_val is not None and hspu_part_val is None:
-        hspu_part_val = max(1, int(round(hspu_neg_val / 2)))
-        max_map["HSPU partiels (mur)"] = ("reps", hspu_part_val)
-
-    if hspu_part_val is not None and hspu_val is None:
-        hspu_val = max(1, int(round(hspu_part_val / 2)))
-        max_map["HSPU"] = ("reps", hspu_val)
+    derivations = load_derivations()
+    memo_store = _derived_memo_store()
+    with store_lock():
+        cached = memo_store.get(str(data_path))
+    memo = derived_memo_for(cached, max_map, derivations, changed)
+    resolved = resolve_derived_maxes(max_map, derivations, changed=changed, memo=memo)
+    with store_lock():
+        memo_store[str(data_path)] = (max_map, derivations, resolved)
+    max_map = resolved
 
     rows = []
     for _, row in df_exam.iterrows():
         ex = row["Exercice"]
-        cat = row["Category"]
         unit, base_val = max_map.get(ex, (row["Unit"], None))
-        rpes = rpe_from_max(base_val, unit)
         rows.append({
             "Exercice": ex,
-            "Category": cat,
+            "Category": row["Category"],
             "Unit": unit,
-            "RPE5": rpes[5],
-            "RPE6": rpes[6],
-            "RPE7": rpes[7],
-            "RPE8": rpes[8],
-            "RPE9": rpes[9],
-            "RPE10": rpes[10],
+            "Max": np.nan if base_val is None else base_val,
         })
 
-    df_db = pd.DataFrame(rows, columns=["Exercice", "Category", "Unit",
-                                        "RPE5", "RPE6", "RPE7", "RPE8", "RPE9", "RPE10"])
+    df_db = build_rpe_table(pd.DataFrame(rows, columns=["Exercice", "Category", "Unit", "Max"]))
 
     if "RPE_DATABASE" not in wb.sheetnames:
         ws_db = wb.create_sheet("RPE_DATABASE")
@@ -334,130 +1590,200 @@ def recompute_rpe_database(wb, data_path):
         ws_db = wb["RPE_DATABASE"]
         ws_db.delete_rows(1, ws_db.max_row)
 
-    ws_db.append(["Exercice", "Category", "Unit", "RPE5", "RPE6", "RPE7", "RPE8", "RPE9", "RPE10"])
-    for _, r in df_db.iterrows():
-        ws_db.append(list(r.values))
+    ws_db.append(RPE_DB_COLUMNS)
+    for ex, cat, unit, reps, *vals in df_db.itertuples(index=False):
+        cast = float if unit == "kg" else int
+        ws_db.append([ex, cat, unit, None if pd.isna(reps) else int(reps)]
+                     + [None if pd.isna(v) else cast(v) for v in vals])
+
+    save_workbook(wb, data_path, "RPE_DATABASE recalculée")
+    index = build_rpe_index(df_db)
+    with store_lock():
+        _rpe_index_store()[str(data_path)] = (data_fingerprint(data_path), index)
+    rpe_index_from_file.publish(data_path, index)
+
+
+@st.cache_resource
+def _rpe_index_store():
+    """Index RPE en mémoire, partagé entre les reruns :
+    {data_path: (empreinte du fichier, index)}.
+    """
+    return {}
+
+
+def build_rpe_index(df_db):
+    """Construit {exercice: {"Category", "Unit", "RPE": {reps: {5: v5, ..., 10: v10}}}}
+    à partir d'un DataFrame au format RPE_DATABASE.
+    reps vaut None pour les exercices en reps/sec (et pour l'ancien format sans colonne Reps).
+    """
+    index = {}
+    if df_db is None or df_db.empty:
+        return index
+    if "Reps" not in df_db.columns:
+        df_db = df_db.assign(Reps=None)
+    for ex, cat, unit, reps, *vals in df_db[RPE_DB_COLUMNS].itertuples(index=False):
+        if pd.isna(ex):
+            continue
+        entry = index.setdefault(ex, {"Category": cat, "Unit": unit, "RPE": {}})
+        key = None if pd.isna(reps) else int(reps)
+        cast = float if unit == "kg" else int
+        entry["RPE"][key] = {r: (None if pd.isna(v) else cast(v)) for r, v in zip(RPE_LEVELS, vals)}
+    return index
+
+
+@timed
+def get_rpe_index(data_path: Path):
+    """Retourne l'index RPE de la version courante du fichier : celui gardé en
+    mémoire, sinon celui du cache partagé (reconstruit depuis RPE_DATABASE si
+    aucune réplique ne l'a encore publié).
+    """
+    store = _rpe_index_store()
+    key = str(data_path)
+    fingerprint = data_fingerprint(data_path)
+    with store_lock():
+        cached = store.get(key)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, rpe_index_from_file(data_path))
+        with store_lock():
+            store[key] = cached
+    return cached[1]
+
+
+@shared_cached
+def rpe_index_from_file(data_path: Path):
+    try:
+        df_db = read_excel_sheet(data_path, "RPE_DATABASE")
+    except Exception:
+        df_db = None
+    return build_rpe_index(df_db)
+
 
-    wb.save(data_path)
+def rpe_entry_row(entry, reps=1):
+    """Ligne {5: v5, ..., 10: v10} d'une entrée de l'index pour un nombre de reps."""
+    matrix = entry["RPE"]
+    if entry["Unit"] == "kg" and reps in matrix:
+        return matrix[reps]
+    return matrix.get(None, {})
+
+
+def get_rpe_target(data_path: Path, ex, rpe, reps=1):
+    """Charge / reps / sec cible pour un exercice à un niveau de RPE (ou None).
+    Pour les exercices en kg, reps = nombre de reps de la série visée.
+    """
+    entry = get_rpe_index(data_path).get(ex)
+    if entry is None:
+        return None
+    return rpe_entry_row(entry, reps).get(rpe)
 
 
 def page_rpe_exam():
     st.header("🎯 RPE EXAM – Tests de référence")
 
-    wb, data_path = get_excel_file()
+    data_path = ensure_data_file()
 
     st.markdown("**Entre uniquement les exos que tu as testés.** Les autres resteront avec leurs anciennes valeurs.")
 
-    def bloc_exam(title, exos, rules_key_prefix):
+    def bloc_exam(title, category):
         st.subheader(title)
-        for ex in exos:
+        for ex in EXERCISES["categories"][category]["exercises"]:
             cols = st.columns(3)
             cols[0].markdown(f"**{ex}**")
-            kg_field, reps_field, sec_field = None, None, None
-
-            if title.startswith("EXAMENS LEGS"):
-                kg_field = cols[1].text_input("kg", key=f"{rules_key_prefix}_{ex}_kg")
-                reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-            elif title.startswith("EXAMENS FULL"):
-                if ex == "Farmer Walk lourd":
-                    kg_field = cols[1].text_input("kg", key=f"{rules_key_prefix}_{ex}_kg")
-                else:
-                    kg_field = cols[1].text_input("kg", key=f"{rules_key_prefix}_{ex}_kg")
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-            elif title.startswith("EXAMENS PUSH"):
-                if ex in ["Pompes", "Pompes diamants", "Dips"]:
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-                elif ex in ["Chest-to-wall Hold", "Handstand Hold"]:
-                    sec_field = cols[2].text_input("sec", key=f"{rules_key_prefix}_{ex}_sec")
-                elif ex in ["Pike push-up", "HSPU Négative", "HSPU partiels (mur)", "HSPU"]:
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-                else:
-                    kg_field = cols[1].text_input("kg", key=f"{rules_key_prefix}_{ex}_kg")
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-            elif title.startswith("EXAMENS PULL"):
-                if ex in ["Tractions", "Muscle-up"]:
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
-                else:
-                    kg_field = cols[1].text_input("kg", key=f"{rules_key_prefix}_{ex}_kg")
-                    reps_field = cols[2].text_input("reps", key=f"{rules_key_prefix}_{ex}_reps")
+            for field in EXERCISES["exercises"][ex]["fields"]:
+                cols[1 if field == "kg" else 2].text_input(field, key=f"{category}_{ex}_{field}")
+
+    # Formulaire : aucune lecture de l'Excel pendant la saisie, tout part à la validation.
+    with st.form("rpe_exam_form"):
+        for i, category in enumerate(EXERCISES["categories"]):
+            if i:
+                st.markdown("---")
+            bloc_exam(f"EXAMENS {category} RPE :", category)
+
+        submitted = st.form_submit_button("✅ Valider les examens RPE")
+
+    if submitted:
+        pending = {}
+        for ex, spec in EXERCISES["exercises"].items():
+            for field, col in (("kg", 3), ("reps", 4), ("sec", 5)):
+                raw = st.session_state.get(f"{spec['category']}_{ex}_{field}", "").strip()
+                if raw == "":
+                    continue
+                try:
+                    pending.setdefault(ex, {})[col] = float(raw)
+                except ValueError:
+                    pass
+            # e1RM calculé sur la paire kg x reps : un kg saisi sans reps est un
+            # single, pas une mise à jour qui garderait les reps de l'ancien test
+            values = pending.get(ex)
+            if spec["unit"] == "kg" and values and 3 in values and 4 not in values:
+                values[4] = 1.0
+
+        if not pending:
+            st.info("Aucune valeur saisie : rien à enregistrer.")
+            return
 
-    bloc_exam("EXAMENS LEGS RPE :", LEGS_EXOS, "LEGS")
-    st.markdown("---")
-    bloc_exam("EXAMENS PUSH RPE :", PUSH_EXOS, "PUSH")
-    st.markdown("---")
-    bloc_exam("EXAMENS PULL RPE :", PULL_EXOS, "PULL")
-    st.markdown("---")
-    bloc_exam("EXAMENS FULL RPE :", FULL_EXOS, "FULL")
+        with workbook_lock():
+            wb, data_path = get_excel_file()
+            ws = wb["RPE_EXAM"]
+            cells = diff_rpe_exam(ws, pending)
+            changed = set()
+            for ex, row, col, val in cells:
+                ws.cell(row=row, column=col).value = val
+                changed.add(ex)
+            if cells:
+                save_workbook(wb, data_path, "RPE EXAM")
+
+        if not cells:
+            st.info("Valeurs identiques aux examens actuels : rien à enregistrer.")
+            return
 
-    if st.button("✅ Valider les examens RPE"):
-        ws = wb["RPE_EXAM"]
+        # RPE_DATABASE et analyses recalculées par le worker, hors du chemin de la requête
+        analytics_worker().notify(data_path, rpe=True, changed=changed)
+        st.success(f"Examens RPE mis à jour ({len(cells)} valeur(s) modifiée(s)). "
+                   "Base de données RPE en cours de recalcul en arrière-plan.")
 
-        ex_row_map = {}
-        for r in range(2, ws.max_row + 1):
-            ex_name = ws.cell(row=r, column=1).value
-            ex_row_map[ex_name] = r
 
-        def update_exos(exos, prefix):
-            for ex in exos:
-                row = ex_row_map.get(ex)
-                if not row:
-                    continue
-                kg_key = f"{prefix}_{ex}_kg"
-                reps_key = f"{prefix}_{ex}_reps"
-                sec_key = f"{prefix}_{ex}_sec"
-                kg_val = st.session_state.get(kg_key, "").strip() if kg_key in st.session_state else ""
-                reps_val = st.session_state.get(reps_key, "").strip() if reps_key in st.session_state else ""
-                sec_val = st.session_state.get(sec_key, "").strip() if sec_key in st.session_state else ""
-
-                if kg_val != "":
-                    try:
-                        ws.cell(row=row, column=3).value = float(kg_val)
-                    except ValueError:
-                        pass
-                if reps_val != "":
-                    try:
-                        ws.cell(row=row, column=4).value = float(reps_val)
-                    except ValueError:
-                        pass
-                if sec_val != "":
-                    try:
-                        ws.cell(row=row, column=5).value = float(sec_val)
-                    except ValueError:
-                        pass
-
-        update_exos(LEGS_EXOS, "LEGS")
-        update_exos(PUSH_EXOS, "PUSH")
-        update_exos(PULL_EXOS, "PULL")
-        update_exos(FULL_EXOS, "FULL")
-
-        wb.save(data_path)
-        recompute_rpe_database(wb, data_path)
-        st.success("Examens RPE mis à jour et base de données RPE recalculée.")
+@timed
+def diff_rpe_exam(ws, pending):
+    """Compare les saisies {ex: {colonne: valeur}} à la feuille RPE_EXAM.
+    Retourne [(ex, ligne, colonne, valeur)] pour les seules cellules qui changent.
+    """
+    cells = []
+    for r, values in enumerate(ws.iter_rows(min_row=2, max_col=5, values_only=True), start=2):
+        ex = values[0]
+        if ex not in pending:
+            continue
+        for col, val in pending[ex].items():
+            if values[col - 1] != val:
+                cells.append((ex, r, col, val))
+    return cells
 
 
 def page_rpe_database():
     st.header("📚 BASE DE DONNÉE – RPE 5 à 10")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
-    try:
-        df_db = pd.read_excel(data_path, sheet_name="RPE_DATABASE")
-    except Exception as e:
-        st.warning(f"Impossible de lire RPE_DATABASE : {e}")
+    index = get_rpe_index(data_path)
+    if not index:
+        st.warning("Impossible de lire RPE_DATABASE (feuille absente ou vide).")
         return
 
+    reps = st.select_slider("Reps par série (exercices en kg)", options=RPE_REPS, value=1)
+    st.caption("Charges kg = e1RM (test kg x reps) x % RTS. Exercices en reps/sec : proportion du max.")
+
     def show_block(title, category):
         st.subheader(title)
-        sub = df_db[df_db["Category"] == category].copy()
-        if sub.empty:
+        rows = []
+        for ex, entry in index.items():
+            if entry["Category"] != category:
+                continue
+            row = rpe_entry_row(entry, reps)
+            rows.append({"Nom de l’exercice": ex, "Unité": entry["Unit"],
+                         **{f"RPE{r}": row.get(r) for r in RPE_LEVELS}})
+        if not rows:
             st.info("Aucune donnée pour l'instant.")
             return
-        sub = sub[["Exercice", "Unit", "RPE5", "RPE6", "RPE7", "RPE8", "RPE9", "RPE10"]]
-        sub = sub.rename(columns={
-            "Exercice": "Nom de l’exercice",
-            "Unit": "Unité"
-        })
-        st.dataframe(sub, use_container_width=True)
+        st.dataframe(pd.DataFrame(rows), width="stretch")
 
     show_block("RÉSULTATS LEGS RPE", "LEGS")
     st.markdown("---")
@@ -472,51 +1798,111 @@ def page_rpe_database():
 # PAGES SEANCES
 # ======================
 
-def find_or_create_session_row(ws, session_number: int):
+def find_or_create_session_row(ws, session_number: int, session_date):
+    """Ligne de la séance (numéro, date) : une séance est identifiée par son
+    numéro ET sa date, le même numéro à une autre date est une nouvelle ligne.
+    """
+    date_col = ensure_column(ws, "Date")
     for r in range(2, ws.max_row + 1):
-        if ws.cell(row=r, column=1).value == session_number:
+        if ws.cell(row=r, column=1).value != session_number:
+            continue
+        day = ws.cell(row=r, column=date_col).value
+        if isinstance(day, datetime):
+            day = day.date()
+        if day == session_date:
             return r
     new_row = ws.max_row + 1 if ws.max_row >= 2 else 2
     ws.cell(row=new_row, column=1).value = session_number
     return new_row
 
 
-def page_seance_generic(title, sheet_name, exos, modes):
+def page_seance_generic(title, category):
     st.header(title)
+    sheet_name = EXERCISES["categories"][category]["sheet"]
+    exos = EXERCISES["categories"][category]["exercises"]
 
-    wb, data_path = get_excel_file()
-    if sheet_name not in wb.sheetnames:
+    data_path = ensure_data_file()
+    headers = get_sheet_headers(str(data_path), sheet_name)
+    if headers is None:
         st.error(f"Feuille '{sheet_name}' introuvable dans Excel.")
         return
-    ws = wb[sheet_name]
 
     session = st.number_input("Numéro de séance", min_value=1, step=1, value=1)
-    st.write("Remplis uniquement les exercices faits. Laisse vide pour ignorer.")
-
-    headers = {ws.cell(row=1, column=c).value: c for c in range(1, ws.max_column + 1)}
+    col_rpe, col_reps = st.columns(2)
+    rpe_cible = col_rpe.select_slider("RPE cible (affiché à côté de chaque exercice)",
+                                      options=RPE_LEVELS, value=8)
+    reps_cible = col_reps.select_slider("Reps visées par série", options=RPE_REPS, value=5)
+    st.write("Remplis uniquement les exercices faits. Laisse vide pour ignorer. "
+             "Les valeurs grisées sont la progression proposée.")
+
+    rpe_index = get_rpe_index(data_path)
+    last_index = exercise_index(data_path)
+
+    # Prescriptions de la semaine (Auto-Mésocycle), copiables dans les champs
+    prescriptions = {}
+    meso = get_auto_mesocycle(data_path)
+    meso_row = mesocycle_week(meso, date.today()) if meso is not None else None
+    if meso_row is not None:
+        week = meso["plan"].iloc[meso_row]
+        st.caption(f"Auto-Mésocycle : {week['Mois']} {week['Semaine']} ({week['Type']}) – "
+                   f"{week['Reps']} reps à RPE {week['RPE']}")
+        prescriptions = {ex: p for ex in exos if (p := prescription_for(meso, meso_row, ex))}
+    prefill = {}
+    for ex, prescribed in prescriptions.items():
+        fields = EXERCISES["exercises"][ex]["fields"]
+        for field, v in zip(("kg", "reps", "sec"), prescribed):
+            if field in fields and v is not None:
+                prefill[f"{sheet_name}_{session}_{ex}_{field}"] = _fmt(v)
+    if prefill:
+        st.button("📝 Pré-remplir avec les prescriptions", on_click=st.session_state.update,
+                  args=(prefill,))
 
     inputs = []
 
-    for ex in exos:
-        mode = modes.get(ex, "kg_reps")
-        cols = st.columns(3)
-        cols[0].markdown(f"**{ex}**")
-        if mode in ("kg_reps", "kg_only"):
-            kg_col = f"{ex} (kg)"
-            kg_str = cols[1].text_input("kg", key=f"{sheet_name}_{session}_{ex}_kg")
-            inputs.append((kg_col, "kg", kg_str))
-        if mode in ("kg_reps", "reps_only"):
-            reps_col = f"{ex} (reps)"
-            reps_str = cols[2].text_input("reps", key=f"{sheet_name}_{session}_{ex}_reps")
-            inputs.append((reps_col, "reps", reps_str))
-        if mode == "sec_only":
-            sec_col = f"{ex} (sec)"
-            sec_str = cols[2].text_input("sec", key=f"{sheet_name}_{session}_{ex}_sec")
-            inputs.append((sec_col, "sec", sec_str))
-
-    if st.button(f"💾 Enregistrer {title}"):
-        row = find_or_create_session_row(ws, int(session))
-
+    # Formulaire : la saisie ne déclenche aucun rerun, l'Excel n'est ouvert qu'à l'envoi.
+    with st.form(f"form_{sheet_name}_{session}"):
+        session_date = st.date_input("Date de la séance", value=date.today(),
+                                     key=f"{sheet_name}_{session}_date")
+        for ex in exos:
+            spec = EXERCISES["exercises"][ex]
+            cols = st.columns(3)
+            cols[0].markdown(f"**{ex}**")
+            entry = rpe_index.get(ex)
+            target = rpe_entry_row(entry, reps_cible).get(rpe_cible) if entry else None
+            if target is not None and entry["Unit"] == "kg":
+                cols[0].caption(f"Cible RPE {rpe_cible} : {target} kg x {reps_cible}")
+            elif target is not None:
+                cols[0].caption(f"Cible RPE {rpe_cible} : {target} {entry['Unit']}")
+            done = last_index.get(ex)
+            proposed = progression_target(spec["mode"], done, reps_cible, target) if done else None
+            if done:
+                cols[0].caption(describe_last(done))
+            if ex in prescriptions:
+                cols[0].caption("Prescrit : " + " x ".join(
+                    f"{_fmt(v)} {u}" for v, u in zip(prescriptions[ex], ("kg", "reps", "s"))
+                    if v is not None))
+            hints = dict(zip(("kg", "reps", "sec"), (_fmt(v) if v is not None else None
+                                                     for v in (proposed or (None, None, None)))))
+            for field in spec["fields"]:
+                sval = cols[1 if field == "kg" else 2].text_input(
+                    field, key=f"{sheet_name}_{session}_{ex}_{field}", placeholder=hints[field])
+                inputs.append((spec["columns"][field], field, sval))
+
+        submitted = st.form_submit_button(f"💾 Enregistrer {title}")
+
+    # Valeurs inhabituelles : signalées avant l'écriture, enregistrées sur confirmation
+    pending_key = f"outliers_{sheet_name}_{session}"
+    confirmed = False
+    pending_slot = st.empty()
+    if st.session_state.get(pending_key):
+        with pending_slot.container():
+            st.warning("Valeurs inhabituelles (faute de frappe ?) : " + " ; ".join(
+                st.session_state[pending_key]))
+            confirmed = st.button("⚠️ Enregistrer quand même", key=f"{pending_key}_confirm")
+
+    if submitted or confirmed:
+        values = []
+        entries = []
         for col_name, vtype, sval in inputs:
             sval = sval.strip()
             if sval == "":
@@ -529,103 +1915,262 @@ def page_seance_generic(title, sheet_name, exos, modes):
                     val = float(sval)
                 else:
                     val = int(float(sval))
-                ws.cell(row=row, column=col_idx).value = val
             except ValueError:
                 continue
+            values.append((col_idx, val))
+            entries.append((*EXERCISES["columns"][col_name], float(val)))
+
+        flagged = [] if confirmed else flag_outliers(exercise_stats(data_path), entries)
+        if flagged:
+            st.session_state[pending_key] = [
+                f"{ex} {_fmt(value)} {field} (moyenne {mean:.1f}, z = {z:+.1f})"
+                for ex, field, value, mean, z in flagged]
+            st.rerun()
+        st.session_state.pop(pending_key, None)
+        pending_slot.empty()
+
+        with workbook_lock():
+            with edit_workbook(f"{title} – Séance {int(session)}") as (wb, data_path):
+                before_fingerprint = data_fingerprint(data_path)
+                ws = wb[sheet_name]
+                row = find_or_create_session_row(ws, int(session), session_date)
+                before = session_row_frame(ws, row, category)
+                for col_idx, val in values:
+                    ws.cell(row=row, column=col_idx).value = val
+                ws.cell(row=row, column=ensure_column(ws, "Date")).value = session_date
+                after = session_row_frame(ws, row, category)
+            update_volume_cube(data_path, before_fingerprint, before, after)
+            update_exercise_index(data_path, before_fingerprint, before, after)
+            update_exercise_stats(data_path, before_fingerprint, before, after)
+            carry_auto_mesocycle(data_path, before_fingerprint)
 
-        wb.save(data_path)
         st.success(f"{title} – Séance {int(session)} enregistrée.")
 
 
 def page_seance_legs():
-    page_seance_generic("SÉANCE LEGS", "Seance_Legs", LEGS_EXOS, LEGS_MODES)
+    page_seance_generic("SÉANCE LEGS", "LEGS")
 
 
 def page_seance_push():
-    page_seance_generic("SÉANCE PUSH", "Seance_Push", PUSH_EXOS, PUSH_MODES)
+    page_seance_generic("SÉANCE PUSH", "PUSH")
 
 
 def page_seance_pull():
-    page_seance_generic("SÉANCE PULL", "Seance_Pull", PULL_EXOS, PULL_MODES)
+    page_seance_generic("SÉANCE PULL", "PULL")
 
 
 def page_seance_full():
-    page_seance_generic("SÉANCE FULL", "Seance_Full", FULL_EXOS, FULL_MODES)
+    page_seance_generic("SÉANCE FULL", "FULL")
 
 
 # ======================
 # METRIQUES : CHARGE, FATIGUE, SAH V2
 # ======================
 
-def load_all_sessions_wide(data_path: Path):
+@timed
+def load_all_sessions_wide(data_path: Path, archived=False):
+    """Tableau large de toutes les séances (float, trié par date puis séance ;
+    colonne Date, NaT pour les séances saisies avant l'ajout des dates).
+    archived=True : vue longue, séances des saisons archivées comprises.
+    Servi depuis la matrice memory-mappée de CACHE_DIR si elle correspond à
+    l'empreinte du fichier (et des archives), sinon relu puis persisté.
+    """
+    fingerprint, name = data_fingerprint(data_path), "sessions"
+    archives = archive_fingerprint(data_path) if archived else ""
+    if archives:
+        fingerprint, name = f"{fingerprint}+{archives}", "sessions_all"
+    df_all = load_session_matrix(data_path, fingerprint, name)
+    if df_all is None:
+        df_all = parse_all_sessions_wide(data_path, archived=bool(archives))
+        if df_all is not None:
+            df_all = store_session_matrix(data_path, fingerprint, df_all, name)
+    return df_all
+
+
+def session_matrix_paths(data_path, name="sessions"):
+    """(matrice .npy, index des colonnes .json) du cache de séances de data_path."""
+    base = Path(CACHE_DIR) / athlete_id(data_path)
+    return base.with_name(f"{base.name}.{name}.npy"), base.with_name(f"{base.name}.{name}.json")
+
+
+@timed
+def load_session_matrix(data_path, fingerprint, name="sessions"):
+    """Ouvre la matrice persistée en mmap (lecture seule, pages partagées entre
+    process) ; None si absente, illisible ou d'une autre version du fichier.
+    """
+    npy_path, header_path = session_matrix_paths(data_path, name)
+    try:
+        header = json.loads(header_path.read_text(encoding="utf-8"))
+        if header.get("fingerprint") != fingerprint:
+            return None
+        matrix = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    columns = header["columns"]
+    if matrix.shape != (header["rows"], len(columns)):
+        return None
+    df_all = pd.DataFrame(matrix, columns=columns, copy=False)
+    df_all["Séance"] = df_all["Séance"].astype(int)
+    df_all["Date"] = pd.to_datetime(df_all["Date"], unit="D")
+    return df_all
+
+
+@timed
+def store_session_matrix(data_path, fingerprint, df_all, name="sessions"):
+    """Persiste df_all en matrice float64 + index des colonnes, puis le relit en
+    mmap. Écritures atomiques ; en cas d'échec (écriture, ou cellule non
+    convertible en float) on garde le tableau en mémoire.
+    """
+    npy_path, header_path = session_matrix_paths(data_path, name)
+    # dates stockées en jours depuis l'epoch (NaN si absente)
+    days = (df_all["Date"] - pd.Timestamp(0)) / pd.Timedelta(days=1)
+    try:
+        matrix = df_all.assign(Date=days).to_numpy(dtype="float64", na_value=np.nan)
+    except (TypeError, ValueError):
+        return df_all.reset_index(drop=True)
+    header = {
+        "fingerprint": fingerprint,
+        "rows": int(matrix.shape[0]),
+        "columns": [str(c) for c in df_all.columns],
+    }
+    try:
+        npy_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_npy = npy_path.with_name(npy_path.name + ".tmp")
+        with open(tmp_npy, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_npy, npy_path)
+        tmp_header = header_path.with_name(header_path.name + ".tmp")
+        tmp_header.write_text(json.dumps(header, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_header, header_path)
+    except OSError:
+        return df_all.reset_index(drop=True)
+    mapped = load_session_matrix(data_path, fingerprint, name)
+    return mapped if mapped is not None else df_all.reset_index(drop=True)
+
+
+def parse_all_sessions_wide(data_path: Path, archived=False):
     frames = []
-    for sheet in ["Seance_Legs", "Seance_Push", "Seance_Pull", "Seance_Full"]:
+    for sheet in SESSION_SHEETS.values():
         try:
-            df = pd.read_excel(data_path, sheet_name=sheet)
-            df["Séance"] = pd.to_numeric(df["Séance"], errors="coerce")
-            df = df.dropna(subset=["Séance"])
-            frames.append(df)
+            frames.append(read_excel_sheet(data_path, sheet))
         except Exception:
+            frames.append(None)
+    if archived:
+        frames = [concat_frames([old, live])
+                  for old, live in zip(read_archived_sheets(data_path), frames)]
+    return sessions_wide(frames)
+
+
+_EXO_COL_RE = re.compile(r"^(.*) \((kg|reps|sec)\)$")
+
+
+def _column_exercise(col):
+    """Exercice d'une colonne du tableau large : d'après le registre, sinon
+    d'après le suffixe « (kg|reps|sec) » (colonnes ajoutées à la main), ou None.
+    """
+    known = EXERCISES["columns"].get(col)
+    if known:
+        return known[0]
+    m = _EXO_COL_RE.match(str(col))
+    return m.group(1) if m else None
+
+
+def exercise_columns(df_all):
+    """Pour chaque exercice du tableau large : (nom, kg, reps, sec, saisi), en
+    tableaux float (NaN si absent) et masque des lignes où il a été saisi.
+    """
+    def column(name):
+        if name not in df_all.columns:
+            return np.full(len(df_all), np.nan)
+        return _to_float(df_all[name]).to_numpy(dtype=float)
+
+    for base in dict.fromkeys(b for b in map(_column_exercise, df_all.columns) if b):
+        kg, reps, sec = column(f"{base} (kg)"), column(f"{base} (reps)"), column(f"{base} (sec)")
+        done = ~(np.isnan(kg) & np.isnan(reps) & np.isnan(sec))
+        if done.any():
+            yield base, kg, reps, sec, done
+
+
+def concat_frames(frames):
+    """pd.concat des DataFrames non None (None s'il n'y en a aucun)."""
+    frames = [df for df in frames if df is not None]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def sessions_wide(frames):
+    """Assemble les feuilles de séance lues (une par catégorie, dans l'ordre de
+    SESSION_SHEETS, None si absente) : Séance, Date, Bloc puis les exercices.
+    """
+    tagged = []
+    for bloc, df in enumerate(frames):
+        if df is None or "Séance" not in df.columns:
             continue
-    if not frames:
+        df = df.assign(Séance=pd.to_numeric(df["Séance"], errors="coerce"), Bloc=float(bloc))
+        tagged.append(df.dropna(subset=["Séance"]))
+    if not tagged:
         return None
-    df_all = pd.concat(frames, ignore_index=True)
-    df_all["Séance"] = df_all["Séance"].astype(int)
-    df_all = df_all.sort_values("Séance")
+    df_all = pd.concat(tagged, ignore_index=True)
+    if "Date" in df_all.columns:
+        dates = pd.to_datetime(df_all["Date"], errors="coerce").dt.normalize()
+    else:
+        dates = pd.Series(pd.NaT, index=df_all.index, dtype="datetime64[ns]")
+    # saisies texte (« 100kg ») -> NaN : le tableau est persisté en float64
+    values = df_all.drop(columns=["Séance", "Date", "Bloc"], errors="ignore").apply(_to_float)
+    df_all = pd.concat([df_all["Séance"].astype(int), dates.rename("Date"), df_all["Bloc"],
+                        values], axis=1)
+    df_all = df_all.sort_values(["Date", "Séance"], kind="stable", na_position="first")
     return df_all
 
 
+@timed
+@shared_cached
 def compute_session_metrics(data_path: Path):
-    df_all = load_all_sessions_wide(data_path)
-    if df_all is None:
-        return None
-
-    loads = {}
-
-    for _, row in df_all.iterrows():
-        s = int(row["Séance"])
-        load_row = 0.0
-        for col in df_all.columns:
-            if col == "Séance":
-                continue
-            val = row[col]
-            if pd.isna(val):
-                continue
+    return session_loads(load_all_sessions_wide(data_path))
 
-            if col.endswith(" (kg)"):
-                base = float(val)
-                base_name = col[:-5]
-                reps_col = base_name + " (reps)"
-                if reps_col in df_all.columns:
-                    reps = row.get(reps_col)
-                    if pd.notna(reps):
-                        load_row += base * float(reps)
-                    else:
-                        load_row += base
-                else:
-                    load_row += base
-            elif col.endswith(" (reps)") or col.endswith(" (sec)"):
-                load_row += float(val)
-
-        loads[s] = loads.get(s, 0.0) + load_row
 
-    if not loads:
+def session_loads(df_all):
+    """Load total par séance à partir du tableau large des séances.
+    Une séance = (date, numéro) : les lignes de feuilles différentes ne sont
+    regroupées que si elles portent le même numéro à la même date.
+    """
+    if df_all is None or df_all.empty:
         return None
 
-    df_sessions = pd.DataFrame(
-        [{"Séance": k, "Load": v} for k, v in loads.items()]
-    ).sort_values("Séance")
+    # kg x reps (kg seul sans reps), plus les reps et les secondes saisies
+    load = np.zeros(len(df_all))
+    for _, kg, reps, sec, _done in exercise_columns(df_all):
+        load += np.where(np.isnan(kg), 0.0, np.where(np.isnan(reps), kg, kg * reps))
+        load += np.nan_to_num(reps) + np.nan_to_num(sec)
+
+    df_sessions = (df_all[["Date", "Séance"]].assign(Load=load)
+                   .groupby(["Date", "Séance"], dropna=False, sort=False)["Load"]
+                   .sum().reset_index()[["Séance", "Date", "Load"]])
+    df_sessions["Date"] = pd.to_datetime(df_sessions["Date"])
+    df_sessions = df_sessions.sort_values(["Date", "Séance"], kind="stable",
+                                          na_position="first", ignore_index=True)
 
     return df_sessions
 
 
+@timed
+@shared_cached
 def compute_fatigue_metrics(data_path: Path, window: int = 7):
-    df_s = compute_session_metrics(data_path)
+    return fatigue_from_sessions(compute_session_metrics(data_path), window)
+
+
+def fatigue_from_sessions(df_s, window: int = 7):
+    """(charge moyenne, monotony, strain) des séances des `window` derniers jours
+    calendaires (jusqu'à la dernière séance datée), ou des `window` dernières
+    séances si aucune n'est datée.
+    """
     if df_s is None or df_s.empty:
         return None, None, None
 
-    loads = df_s["Load"].values
-    if len(loads) >= window:
+    loads = df_s["Load"].to_numpy()
+    index = TimeIndex(df_s["Date"]) if "Date" in df_s.columns else None
+    if index is not None and len(index):
+        loads_window = loads[index.last_days(window)]
+    elif len(loads) >= window:
         loads_window = loads[-window:]
     else:
         loads_window = loads
@@ -649,203 +2194,1119 @@ def safe_nanmax(arr):
     return float(np.nanmax(arr))
 
 
+def role_values(df_all, role, field=None):
+    """Par ligne du tableau large, la meilleure valeur des exercices tenant le
+    rôle `role` dans le registre : 1RM Epley (kg x reps) si `field` est None,
+    sinon le champ brut. NaN si aucun n'a été saisi.
+    """
+    def column(name):
+        if name is None or name not in df_all.columns:
+            return np.full(len(df_all), np.nan)
+        return _to_float(df_all[name]).to_numpy(dtype=float)
+
+    best = np.full(len(df_all), np.nan)
+    for ex in EXERCISES["roles"].get(role, ()):
+        cols = EXERCISES["exercises"][ex]["columns"]
+        if field is None:
+            values = epley(column(cols.get("kg")), column(cols.get("reps")))
+        else:
+            values = column(cols.get(field))
+        best = np.fmax(best, values)
+    return best
+
+
+@timed
+@shared_cached
 def compute_sah_v2(data_path: Path):
-    df_all = load_all_sessions_wide(data_path)
+    return sah_from_sessions(load_all_sessions_wide(data_path, archived=True))
+
+
+def sah_from_sessions(df_all):
+    """SAH V2 et détails à partir du tableau large des séances."""
     if df_all is None:
         return None, {}
 
-    sq_back_kg = _to_float(df_all.get("Back Squat (kg)"))
-    sq_back_reps = _to_float(df_all.get("Back Squat (reps)"))
-    sq_front_kg = _to_float(df_all.get("Front Squat (wedge) (kg)"))
-    sq_front_reps = _to_float(df_all.get("Front Squat (wedge) (reps)"))
-    bench_kg = _to_float(df_all.get("Développé couché barre / haltères (kg)"))
-    bench_reps = _to_float(df_all.get("Développé couché barre / haltères (reps)"))
-    roman_kg = _to_float(df_all.get("Romanian Deadlift (barre) (kg)"))
-    roman_reps = _to_float(df_all.get("Romanian Deadlift (barre) (reps)"))
-
-    squat1_back = epley(sq_back_kg, sq_back_reps)
-    squat1_front = epley(sq_front_kg, sq_front_reps)
-    if squat1_back.size and squat1_front.size:
-        squat_1rm = np.nanmax(np.vstack([squat1_back, squat1_front]), axis=0)
-    else:
-        squat_1rm = squat1_back if squat1_back.size else squat1_front
+    best_squat = safe_nanmax(role_values(df_all, "squat"))
+    best_bench = safe_nanmax(role_values(df_all, "bench"))
+    best_dead = safe_nanmax(role_values(df_all, "deadlift"))
+
+    sq_target = 220.0
+    bp_target = 160.0
+    dl_target = 260.0
+
+    str_squat = min(best_squat / sq_target, 1.3) if sq_target > 0 else 0
+    str_bench = min(best_bench / bp_target, 1.3) if bp_target > 0 else 0
+    str_dead = min(best_dead / dl_target, 1.3) if dl_target > 0 else 0
+
+    strength_index = float(np.mean([str_squat, str_bench, str_dead]) * 100.0)
+
+    details = {
+        "Squat1RM": round(best_squat, 1),
+        "Bench1RM": round(best_bench, 1),
+        "Dead1RM": round(best_dead, 1),
+        "StrengthIndex": round(strength_index, 1),
+    }
+
+    best_hspu = safe_nanmax(role_values(df_all, "hspu", "reps"))
+    best_mu = safe_nanmax(role_values(df_all, "muscle_up", "reps"))
+    best_tlest = safe_nanmax(role_values(df_all, "weighted_pullup", "kg"))
+
+    details.update({
+        "HSPU": best_hspu,
+        "MU": best_mu,
+        "TractionLestee": best_tlest,
+    })
+
+    hspu_target = 20.0
+    mu_target = 10.0
+    tlest_target = 80.0
+
+    s_hspu = min(best_hspu / hspu_target, 1.3) if hspu_target > 0 else 0
+    s_mu = min(best_mu / mu_target, 1.3) if mu_target > 0 else 0
+    s_tlest = min(best_tlest / tlest_target, 1.3) if tlest_target > 0 else 0
+
+    skill_index = float(np.mean([s_hspu, s_mu, s_tlest]) * 100.0)
+    power_index = float(np.mean([s_mu, s_tlest]) * 100.0)
+
+    details["SkillIndex"] = round(skill_index, 1)
+    details["PowerIndex"] = round(power_index, 1)
+
+    sah_components = [strength_index, skill_index, power_index]
+    weights = [0.4, 0.4, 0.2]
+    sah_v2 = float(np.average(sah_components, weights=weights))
+    sah_v2 = float(np.clip(sah_v2, 0, 100))
+    details["SAH_V2"] = round(sah_v2, 1)
+
+    return sah_v2, details
+
+
+def classify_skill_level(skill_index: float):
+    if skill_index is None:
+        return "Inconnu"
+    if skill_index < 30:
+        return "Débutant"
+    if skill_index < 60:
+        return "Intermédiaire"
+    if skill_index < 85:
+        return "Avancé"
+    return "Élite"
+
+
+def lifestyle_readiness(data_path: Path):
+    """(Readiness par ligne renseignée, TimeIndex de leurs dates) de la feuille
+    Lifestyle, ou (None, None) si elle est absente ou sans colonne Readiness.
+    """
+    try:
+        df_life = read_sheet_evaluated(data_path, "Lifestyle")
+    except Exception:
+        return None, None
+    col = None
+    if "Readiness" in df_life.columns:
+        col = "Readiness"
+    elif df_life.shape[1] >= 9:
+        col = df_life.columns[8]
+    if col is None:
+        return None, None
+    vals = pd.to_numeric(df_life[col], errors="coerce")
+    keep = vals.notna().to_numpy()
+    vals = vals[keep].reset_index(drop=True)
+    dates = df_life["Date"][keep] if "Date" in df_life.columns else [None] * len(vals)
+    return vals, TimeIndex(list(dates))
+
+
+@timed
+def get_latest_readiness(data_path: Path):
+    """Readiness de l'entrée Lifestyle la plus récente (par date si les entrées
+    sont datées, sinon la dernière ligne).
+    """
+    vals, index = lifestyle_readiness(data_path)
+    if vals is None or vals.empty:
+        return None
+    if len(index):
+        return float(vals.iloc[index.rows[-1]])
+    return float(vals.iloc[-1])
+
+
+@timed
+def get_readiness_mean(data_path: Path, days: int = 7):
+    """Readiness moyen des `days` derniers jours calendaires renseignés (tout
+    l'historique si les entrées ne sont pas datées).
+    """
+    vals, index = lifestyle_readiness(data_path)
+    if vals is None or vals.empty:
+        return None
+    if len(index):
+        return float(vals.iloc[index.last_days(days)].mean())
+    return float(vals.mean())
+
+
+@timed
+@shared_cached
+def get_last_session_info(data_path: Path):
+    return last_session_from(compute_session_metrics(data_path))
+
+
+def last_session_from(df_s):
+    if df_s is None or df_s.empty:
+        return None
+    last = df_s.iloc[-1]
+    day = last.get("Date")
+    return {
+        "Séance": int(last["Séance"]),
+        "Date": None if pd.isna(day) else pd.Timestamp(day).date(),
+        "Load": float(last["Load"]),
+    }
+
+
+# ======================
+# ARCHIVES DES SAISONS
+# ======================
+# Les saisons terminées quittent le classeur actif (lectures et sauvegardes
+# plus légères) pour des fichiers Parquet compressés ; les vues longues
+# (load_all_sessions_wide(..., archived=True)) les réunissent aux séances actives.
+
+def archive_dir(data_path):
+    return Path(ARCHIVE_DIR) / athlete_id(data_path)
+
+
+def archive_files(data_path, sheet=None):
+    """Archives Parquet de l'athlète (d'une seule feuille de séance si précisée)."""
+    folder = archive_dir(data_path)
+    if not folder.is_dir():
+        return []
+    return sorted(folder.glob(f"*__{sheet}.parquet" if sheet else "*__*.parquet"))
+
+
+def archive_fingerprint(data_path):
+    """Empreinte de l'ensemble des archives ("" s'il n'y en a pas)."""
+    files = archive_files(data_path)
+    if not files:
+        return ""
+    digest = hashlib.sha1()
+    for path in files:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+@timed
+def read_archived_sheets(data_path):
+    """Séances archivées par feuille, dans l'ordre de SESSION_SHEETS (None si aucune)."""
+    return [concat_frames([pd.read_parquet(p) for p in archive_files(data_path, sheet)])
+            for sheet in SESSION_SHEETS.values()]
+
+
+@timed
+def archive_sessions(wb, data_path, cutoff, label):
+    """Déplace les séances datées d'avant `cutoff` des feuilles Seance_* du
+    classeur ouvert vers ARCHIVE_DIR/<athlète>/<label>__<feuille>.parquet (zstd).
+    Les archives sont écrites avant que l'appelant ne sauvegarde le classeur :
+    en cas d'échec, aucune séance n'est perdue.
+    Retourne {feuille: nombre de séances archivées}.
+    """
+    label = re.sub(r"[^\w-]+", "_", label).strip("_") or "saison"
+    moved = {}
+    for sheet in SESSION_SHEETS.values():
+        if sheet not in wb.sheetnames:
+            continue
+        ws = wb[sheet]
+        headers = [cell.value for cell in ws[1]]
+        if "Date" not in headers:
+            continue
+        date_col = headers.index("Date") + 1
+        rows = []
+        for r in range(2, ws.max_row + 1):
+            day = ws.cell(row=r, column=date_col).value
+            if isinstance(day, datetime):
+                day = day.date()
+            if isinstance(day, date) and day < cutoff and ws.cell(row=r, column=1).value is not None:
+                rows.append(r)
+        if not rows:
+            continue
+
+        cols = [c for c, h in enumerate(headers, start=1) if h not in (None, "")]
+        df = pd.DataFrame([[ws.cell(row=r, column=c).value for c in cols] for r in rows],
+                          columns=[headers[c - 1] for c in cols])
+        for col in df.columns:
+            df[col] = (pd.to_datetime(df[col]) if col == "Date"
+                       else pd.to_numeric(df[col], errors="coerce"))
+        path = archive_dir(data_path) / f"{label}__{sheet}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        df.to_parquet(tmp_path, compression="zstd", index=False)
+        os.replace(tmp_path, path)
+
+        spans = []
+        for r in rows:
+            if spans and spans[-1][0] + spans[-1][1] == r:
+                spans[-1][1] += 1
+            else:
+                spans.append([r, 1])
+        for start, count in reversed(spans):
+            ws.delete_rows(start, count)
+        moved[sheet] = len(rows)
+    return moved
+
+
+def archive_volume_cube(data_path):
+    """Cube de volume des seules archives (immuables entre deux archivages),
+    dans le cache partagé sous l'empreinte des archives.
+    """
+    cache, athlete = shared_cache(), athlete_id(data_path)
+    fingerprint = archive_fingerprint(data_path)
+    hit, cube = cache.get(athlete, "archive_volume_cube", fingerprint)
+    if not hit:
+        cube = build_volume_cube(sessions_wide(read_archived_sheets(data_path)))
+        cache.put(athlete, "archive_volume_cube", fingerprint, cube)
+    return cube
+
+
+# ======================
+# INSTANTANÉS DU CLASSEUR
+# ======================
+
+# Chaque sauvegarde enregistre un instantané : les lignes de chaque feuille sont
+# découpées en blocs de SNAPSHOT_CHUNK_ROWS stockés sous l'empreinte de leur
+# contenu (un bloc identique n'est écrit qu'une fois), plus un manifeste JSON.
+# Un instantané ne coûte donc que les blocs modifiés. Les archives Parquet de
+# l'athlète sont enregistrées de la même façon, fichier par fichier.
+
+def snapshot_dir(data_path):
+    return Path(SNAPSHOT_DIR) / athlete_id(data_path)
+
+
+def _store_object(folder, blob):
+    """Écrit un bloc compressé sous son empreinte s'il est nouveau.
+    Retourne (empreinte, octets écrits).
+    """
+    digest = hashlib.sha256(blob).hexdigest()
+    path = folder / "objects" / digest[:2] / digest
+    if path.exists():
+        return digest, 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = zlib.compress(blob)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return digest, len(data)
+
+
+def _load_object(folder, digest):
+    return zlib.decompress((folder / "objects" / digest[:2] / digest).read_bytes())
+
+
+def list_snapshots(data_path, limit=None):
+    """Manifestes des instantanés, du plus récent au plus ancien."""
+    folder = snapshot_dir(data_path) / "manifests"
+    if not folder.is_dir():
+        return []
+    paths = sorted(folder.glob("*.json"), reverse=True)[:limit]
+    return [json.loads(path.read_text(encoding="utf-8")) for path in paths]
+
+
+def _sheet_rows(ws):
+    """Lignes de valeurs de `ws`, comme list(ws.iter_rows(values_only=True)), mais
+    à partir des seules cellules existantes (iter_rows crée chaque cellule vide,
+    vingt fois plus lent sur un classeur de séances).
+    """
+    cells = getattr(ws, "_cells", None)  # interne à openpyxl (version bornée dans requirements.txt)
+    if cells is None:
+        return list(ws.iter_rows(values_only=True))
+    width, height = ws.max_column, ws.max_row
+    rows = [[None] * width for _ in range(height)]
+    for (r, c), cell in cells.items():
+        rows[r - 1][c - 1] = cell.value
+    return [tuple(row) for row in rows]
+
+
+@timed
+def take_snapshot(wb, data_path, label):
+    """Instantané du classeur ouvert `wb` (déjà sauvegardé dans data_path) et des
+    archives de l'athlète. Retourne le manifeste.
+    """
+    folder = snapshot_dir(data_path)
+    previous = list_snapshots(data_path, limit=1)
+    previous_files = previous[0]["files"] if previous else {}
+    new_bytes = 0
+
+    sheets = []
+    for ws in wb.worksheets:
+        rows = _sheet_rows(ws)
+        chunks = []
+        for start in range(0, len(rows), SNAPSHOT_CHUNK_ROWS):
+            blob = pickle.dumps(rows[start:start + SNAPSHOT_CHUNK_ROWS], protocol=4)
+            digest, written = _store_object(folder, blob)
+            chunks.append(digest)
+            new_bytes += written
+        sheets.append({"name": ws.title, "chunks": chunks})
+
+    files = {}
+    for path in archive_files(data_path):
+        stat = path.stat()
+        known = previous_files.get(path.name)
+        if known and (known["size"], known["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            files[path.name] = known
+            continue
+        digest, written = _store_object(folder, path.read_bytes())
+        files[path.name] = {"hash": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        new_bytes += written
+
+    created = datetime.now()
+    manifest = {
+        "id": created.strftime("%Y%m%d-%H%M%S-%f"),
+        "created": created.isoformat(timespec="seconds"),
+        "label": label,
+        "fingerprint": data_fingerprint(data_path),
+        "new_bytes": new_bytes,
+        "sheets": sheets,
+        "files": files,
+    }
+    path = folder / "manifests" / f"{manifest['id']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def ensure_snapshot(data_path, label):
+    """Instantané de l'état actuel du fichier s'il n'en a pas déjà un (fichier
+    modifié hors de l'app). À appeler sous workbook_lock.
+    """
+    if not Path(data_path).exists():
+        return
+    latest = list_snapshots(data_path, limit=1)
+    if latest and latest[0]["fingerprint"] == data_fingerprint(data_path):
+        return
+    take_snapshot(load_workbook(data_path), data_path, label)
+
+
+def _write_sheet_rows(ws, rows):
+    """Remplace le contenu de `ws` par `rows` en gardant les styles existants."""
+    width = max((len(row) for row in rows), default=0)
+    for r, row in enumerate(rows, start=1):
+        for c, value in enumerate(row, start=1):
+            cell = ws.cell(row=r, column=c)
+            if cell.value != value:
+                cell.value = value
+    if ws.max_row > len(rows):
+        ws.delete_rows(len(rows) + 1, ws.max_row - len(rows))
+    if ws.max_column > width:
+        ws.delete_cols(width + 1, ws.max_column - width)
+
+
+@timed
+def restore_snapshot(data_path, snapshot_id):
+    """Remet le classeur (valeurs et formules de chaque feuille) et les archives
+    dans l'état de l'instantané. L'état remplacé reste restaurable : la
+    restauration est elle-même une sauvegarde, donc un nouvel instantané.
+    """
+    folder = snapshot_dir(data_path)
+    manifest = json.loads((folder / "manifests" / f"{snapshot_id}.json").read_text(encoding="utf-8"))
+    with workbook_lock():
+        ensure_snapshot(data_path, "Avant restauration")
+        with edit_workbook(f"Restauration du {manifest['created'].replace('T', ' ')}") as (wb, data_path):
+            current = {ws.title: ws for ws in wb.worksheets}
+            for position, sheet in enumerate(manifest["sheets"]):
+                rows = [row for digest in sheet["chunks"]
+                        for row in pickle.loads(_load_object(folder, digest))]
+                ws = current.pop(sheet["name"], None) or wb.create_sheet(sheet["name"], position)
+                _write_sheet_rows(ws, rows)
+            for ws in current.values():
+                wb.remove(ws)
+
+            archives = archive_dir(data_path)
+            shutil.rmtree(archives, ignore_errors=True)
+            for name, info in manifest["files"].items():
+                archives.mkdir(parents=True, exist_ok=True)
+                (archives / name).write_bytes(_load_object(folder, info["hash"]))
+    forget_file_caches(data_path)
+    return manifest
+
+
+def reset_data_file(data_path):
+    """Réinitialisation : classeur vierge (modèle) et archives vidées, en tant
+    que nouvel instantané ; l'état précédent reste restaurable.
+    """
+    with workbook_lock():
+        ensure_snapshot(data_path, "Avant réinitialisation")
+        shutil.rmtree(archive_dir(data_path), ignore_errors=True)
+        save_workbook(load_workbook(TEMPLATE_FILE), data_path, "Réinitialisation")
+    forget_file_caches(data_path)
+    analytics_worker().notify(data_path)
+
+
+def forget_file_caches(data_path):
+    """Oublie les caches d'un fichier remplacé en bloc (non liés à son empreinte)."""
+    with store_lock():
+        _rpe_index_store().pop(str(data_path), None)
+        _analytics_store().pop(str(data_path), None)
+        _derived_memo_store().pop(str(data_path), None)
+    get_sheet_headers.clear()
+
+
+# ======================
+# VOLUME : CUBE SEMAINE × CATÉGORIE × EXERCICE
+# ======================
+
+CUBE_DIMS = ("Semaine", "Catégorie", "Exercice")
+CUBE_MEASURES = ("Load", "Tonnage", "Reps", "Séries")
+
+
+def build_volume_cube(df_all):
+    """Cube {(semaine, catégorie, exercice): [load, tonnage, reps, séries]} d'un
+    tableau large de séances. Semaine = lundi 'AAAA-MM-JJ' (None si non datée).
+    Load suit session_loads ; tonnage = kg x reps (1 rep si non saisies) ;
+    séries = nombre de saisies de l'exercice.
+    """
+    cube = {}
+    if df_all is None or df_all.empty:
+        return cube
+    days = pd.to_datetime(df_all["Date"], errors="coerce")
+    mondays = days - pd.to_timedelta(days.dt.weekday, unit="D")
+    weeks = mondays.dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    weeks[mondays.isna().to_numpy()] = None
+    categories = np.asarray(list(SESSION_SHEETS), dtype=object)[
+        df_all["Bloc"].to_numpy().astype(int)]
+
+    parts = []
+    for base, kg, reps, sec, done in exercise_columns(df_all):
+        tonnage = np.where(np.isnan(kg), 0.0, kg * np.where(np.isnan(reps), 1.0, reps))
+        reps0 = np.nan_to_num(reps)
+        parts.append(pd.DataFrame({
+            "Semaine": weeks[done], "Catégorie": categories[done], "Exercice": base,
+            "Load": (tonnage + reps0 + np.nan_to_num(sec))[done],
+            "Tonnage": tonnage[done], "Reps": reps0[done], "Séries": 1.0,
+        }))
+    if not parts:
+        return cube
+    grouped = pd.concat(parts, ignore_index=True).groupby(list(CUBE_DIMS), dropna=False).sum()
+    for (week, cat, ex), vals in zip(grouped.index, grouped.to_numpy().tolist()):
+        cube[(week if isinstance(week, str) else None, cat, ex)] = vals
+    return cube
+
+
+def cube_add(cube, cells, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) des cellules au cube, sur place."""
+    for key, vals in cells.items():
+        merged = [a + sign * b for a, b in zip(cube.get(key, [0.0] * len(vals)), vals)]
+        if merged[3] > 0:
+            cube[key] = merged
+        else:
+            cube.pop(key, None)
+
+
+@timed
+@shared_cached
+def volume_cube(data_path: Path):
+    """Cube de volume de la version courante du fichier (cache partagé ; mis à
+    jour par delta à chaque sauvegarde de séance, reconstruit sinon).
+    """
+    return build_volume_cube(load_all_sessions_wide(data_path))
+
+
+def session_row_frame(ws, row, category):
+    """Ligne `row` d'une feuille de séance ouverte, en tableau large d'une ligne."""
+    values = {cell.value: [ws.cell(row=row, column=cell.column).value]
+              for cell in ws[1] if cell.value not in (None, "")}
+    frames = [None] * len(SESSION_SHEETS)
+    frames[list(SESSION_SHEETS).index(category)] = pd.DataFrame(values)
+    return sessions_wide(frames)
+
+
+def update_volume_cube(data_path, before_fingerprint, before, after):
+    """Reporte sur le cube la modification d'une ligne de séance (before -> after)
+    : le cube de la version précédente du fichier est republié pour la nouvelle,
+    sans relire l'historique. Sans cube précédent, rien à faire (reconstruction
+    à la prochaine lecture).
+    """
+    hit, cube = shared_cache().get(athlete_id(data_path), volume_cube.__name__,
+                                   before_fingerprint)
+    if not hit:
+        return
+    cube_add(cube, build_volume_cube(before), -1)
+    cube_add(cube, build_volume_cube(after), 1)
+    volume_cube.publish(data_path, cube)
+
+
+def cube_frame(cube, by=("Semaine", "Catégorie"), categories=None, exercises=None,
+               start=None, end=None):
+    """Agrège les cellules du cube selon les dimensions `by`, filtrées par
+    catégories / exercices / semaines [start, end] ('AAAA-MM-JJ').
+    Coût proportionnel au nombre de cellules, pas à l'historique.
+    """
+    totals = {}
+    for cell, vals in cube.items():
+        week, cat, ex = cell
+        if categories is not None and cat not in categories:
+            continue
+        if exercises is not None and ex not in exercises:
+            continue
+        if (start is not None or end is not None) and week is None:
+            continue
+        if (start is not None and week < start) or (end is not None and week > end):
+            continue
+        key = tuple(cell[CUBE_DIMS.index(d)] for d in by)
+        acc = totals.setdefault(key, [0.0] * len(CUBE_MEASURES))
+        for i, v in enumerate(vals):
+            acc[i] += v
+    df = pd.DataFrame([(*k, *v) for k, v in totals.items()],
+                      columns=[*by, *CUBE_MEASURES])
+    return df.sort_values(list(by), na_position="first", ignore_index=True)
+
+
+# ======================
+# DERNIÈRES PERFS & RECORDS PAR EXERCICE
+# ======================
+
+def _float_or_none(x):
+    return None if x is None or math.isnan(x) else float(x)
+
+
+def build_exercise_index(df_all):
+    """{exercice: {"last": {...}, "best": {...}}} d'un tableau large de séances
+    (trié par date puis séance). "last" : Séance, Date, kg, reps, sec, e1rm de la
+    dernière saisie ; "best" : max de kg, reps, sec et e1rm (Epley).
+    Types Python natifs : l'index se relit sans pandas.
+    """
+    index = {}
+    if df_all is None or df_all.empty:
+        return index
+    seances = df_all["Séance"].to_numpy()
+    dates = pd.to_datetime(df_all["Date"], errors="coerce")
+    for base, kg, reps, sec, done in exercise_columns(df_all):
+        e1rm = np.where(np.isnan(kg), np.nan, epley(kg, np.where(np.isnan(reps), 1.0, reps)))
+        i = int(np.flatnonzero(done)[-1])
+        day = dates.iloc[i]
+        index[base] = {
+            "last": {
+                "Séance": int(seances[i]),
+                "Date": None if pd.isna(day) else day.date(),
+                "kg": _float_or_none(kg[i]),
+                "reps": _float_or_none(reps[i]),
+                "sec": _float_or_none(sec[i]),
+                "e1rm": _float_or_none(e1rm[i]),
+            },
+            "best": {name: _float_or_none(np.nanmax(v[done])) if not np.isnan(v[done]).all() else None
+                     for name, v in (("kg", kg), ("reps", reps), ("sec", sec), ("e1rm", e1rm))},
+        }
+    return index
+
+
+@timed
+@shared_cached
+def exercise_index(data_path: Path):
+    """Index dernières perfs / records de la version courante du fichier, saisons
+    archivées comprises (cache partagé ; mis à jour à chaque saisie de séance).
+    """
+    return build_exercise_index(load_all_sessions_wide(data_path, archived=True))
+
+
+def _session_order(last):
+    return (last["Date"] is not None, last["Date"] or date.min, last["Séance"])
+
+
+def update_exercise_index(data_path, before_fingerprint, before, after):
+    """Reporte une saisie de séance sur l'index de la version précédente du
+    fichier. Si la ligne modifiée contenait déjà l'un des exercices saisis
+    (correction), un record ou une « dernière » valeur a pu baisser : l'index
+    sera reconstruit à la prochaine lecture.
+    """
+    hit, index = shared_cache().get(athlete_id(data_path), exercise_index.__name__,
+                                    before_fingerprint)
+    if not hit:
+        return
+    previous = build_exercise_index(before)
+    for ex, entry in build_exercise_index(after).items():
+        if ex in previous:
+            if previous[ex] == entry:
+                continue
+            return
+        current = index.get(ex)
+        if current is None:
+            index[ex] = entry
+            continue
+        if _session_order(entry["last"]) >= _session_order(current["last"]):
+            current["last"] = entry["last"]
+        for name, v in entry["best"].items():
+            if v is not None and (current["best"][name] is None or v > current["best"][name]):
+                current["best"][name] = v
+    exercise_index.publish(data_path, index)
+
+
+def progression_target(mode, entry, reps_cible, rpe_target=None):
+    """Cible proposée (kg, reps, sec ; None si sans objet) à partir de la dernière
+    saisie : double progression en kg (+PROGRESSION_KG_STEP une fois les reps
+    visées atteintes, sinon +1 rep), +1 rep ou +PROGRESSION_SEC_STEP sinon ;
+    plafonnée par la cible RPE_DATABASE du jour si elle existe.
+    """
+    last = entry["last"]
+    if mode in ("kg_reps", "kg_only") and last["kg"] is not None:
+        reps_done = last["reps"] or 0
+        if mode == "kg_only" or reps_done >= reps_cible:
+            kg, reps = last["kg"] + PROGRESSION_KG_STEP, reps_cible
+        else:
+            kg, reps = last["kg"], int(reps_done) + 1
+        if rpe_target is not None:
+            kg = min(kg, rpe_target)
+        return round(kg * 2) / 2, (reps if mode == "kg_reps" else None), None
+    if mode == "reps_only" and last["reps"] is not None:
+        reps = int(last["reps"]) + 1
+        return None, (min(reps, int(rpe_target)) if rpe_target is not None else reps), None
+    if mode == "sec_only" and last["sec"] is not None:
+        sec = int(last["sec"]) + PROGRESSION_SEC_STEP
+        return None, None, (min(sec, int(rpe_target)) if rpe_target is not None else sec)
+    return None
+
+
+def _fmt(v):
+    return f"{v:g}" if v is not None else "–"
+
+
+def describe_last(entry):
+    """« Dernière : 100 kg x 5 (S12 du 07/10/2026) · Record e1RM 120 kg »."""
+    last, best = entry["last"], entry["best"]
+    parts = [f"{_fmt(last[k])} {u}" for k, u in (("kg", "kg"), ("reps", "reps"), ("sec", "s"))
+             if last[k] is not None]
+    when = f"S{last['Séance']}" + (f" du {last['Date']:%d/%m/%Y}" if last["Date"] else "")
+    text = f"Dernière : {' x '.join(parts)} ({when})"
+    if best["e1rm"] is not None:
+        text += f" · Record e1RM {best['e1rm']:.1f} kg"
+    elif best["reps"] is not None:
+        text += f" · Record {_fmt(best['reps'])} reps"
+    elif best["sec"] is not None:
+        text += f" · Record {_fmt(best['sec'])} s"
+    return text
+
+
+# ======================
+# VALEURS ABERRANTES : STATISTIQUES GLISSANTES (WELFORD)
+# ======================
+# {exercice: {champ: [n, moyenne, M2]}} : M2 = somme des carrés des écarts à la
+# moyenne (algorithme de Welford). Ajouter ou retirer une saisie coûte O(1) ;
+# une nouvelle valeur est comparée à ces statistiques avant d'être écrite.
+
+def welford_update(stats, x, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) la valeur x de [n, moyenne, M2], sur place."""
+    n, mean, m2 = stats
+    if sign > 0:
+        n += 1
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+    elif n <= 1:
+        n, mean, m2 = 0, 0.0, 0.0
+    else:
+        n -= 1
+        new_mean = mean - (x - mean) / n
+        m2 = max(m2 - (x - new_mean) * (x - mean), 0.0)
+        mean = new_mean
+    stats[:] = [n, mean, m2]
+
+
+def build_exercise_stats(df_all):
+    """Statistiques [n, moyenne, M2] de chaque champ saisi de chaque exercice
+    d'un tableau large de séances, calculées en bloc. Types Python natifs.
+    """
+    stats = {}
+    if df_all is None or df_all.empty:
+        return stats
+    for base, kg, reps, sec, done in exercise_columns(df_all):
+        for field, values in (("kg", kg), ("reps", reps), ("sec", sec)):
+            values = values[~np.isnan(values)]
+            if values.size:
+                mean = float(values.mean())
+                stats.setdefault(base, {})[field] = [
+                    int(values.size), mean, float(((values - mean) ** 2).sum())]
+    return stats
+
+
+@timed
+@shared_cached
+def exercise_stats(data_path: Path):
+    """Statistiques par exercice de la version courante du fichier, saisons
+    archivées comprises (cache partagé ; mis à jour à chaque saisie de séance).
+    """
+    return build_exercise_stats(load_all_sessions_wide(data_path, archived=True))
+
+
+def _row_values(df_row):
+    """[(exercice, champ, valeur)] saisis dans un tableau large d'une ligne."""
+    if df_row is None:
+        return []
+    return [(base, field, float(values[0]))
+            for base, kg, reps, sec, done in exercise_columns(df_row)
+            for field, values in (("kg", kg), ("reps", reps), ("sec", sec))
+            if not np.isnan(values[0])]
+
+
+def update_exercise_stats(data_path, before_fingerprint, before, after):
+    """Reporte une saisie de séance (ligne before -> after) sur les statistiques
+    de la version précédente du fichier : valeurs remplacées retirées, nouvelles
+    ajoutées. Sans statistiques précédentes, reconstruction à la prochaine lecture.
+    """
+    hit, stats = shared_cache().get(athlete_id(data_path), exercise_stats.__name__,
+                                    before_fingerprint)
+    if not hit:
+        return
+    for sign, row in ((-1, before), (1, after)):
+        for ex, field, x in _row_values(row):
+            welford_update(stats.setdefault(ex, {}).setdefault(field, [0, 0.0, 0.0]), x, sign)
+    exercise_stats.publish(data_path, stats)
+
+
+def outlier_score(stats, exercise, field, value):
+    """Écart réduit de `value` aux saisies précédentes de l'exercice, ou None
+    s'il y en a moins de OUTLIER_MIN_COUNT. O(1).
+    """
+    n, mean, m2 = stats.get(exercise, {}).get(field) or (0, 0.0, 0.0)
+    if n < OUTLIER_MIN_COUNT:
+        return None
+    sd = max(math.sqrt(m2 / (n - 1)), OUTLIER_SD_FLOOR * abs(mean), 1e-9)
+    return (value - mean) / sd
+
 
-    bench_1rm = epley(bench_kg, bench_reps)
-    dead_1rm = epley(roman_kg, roman_reps)
+def flag_outliers(stats, entries):
+    """[(exercice, champ, valeur, moyenne, z)] des entrées (exercice, champ,
+    valeur) à plus de OUTLIER_Z écarts-types de leur historique.
+    """
+    flagged = []
+    for ex, field, value in entries:
+        z = outlier_score(stats, ex, field, value)
+        if z is not None and abs(z) > OUTLIER_Z:
+            flagged.append((ex, field, value, stats[ex][field][1], z))
+    return flagged
+
+
+@timed
+def audit_outliers(df_all):
+    """Audit en bloc de l'historique : chaque saisie comparée aux autres saisies
+    du même exercice (moyenne et variance sans elle, vectorisées), pour retrouver
+    les fautes de frappe déjà enregistrées. Tableau trié par |z| décroissant.
+    """
+    columns = ["Séance", "Date", "Exercice", "Champ", "Valeur", "Moyenne", "z"]
+    if df_all is None or df_all.empty:
+        return pd.DataFrame(columns=columns)
+    seances = df_all["Séance"].to_numpy()
+    dates = df_all["Date"].to_numpy()
+    parts = []
+    for base, kg, reps, sec, done in exercise_columns(df_all):
+        for field, values in (("kg", kg), ("reps", reps), ("sec", sec)):
+            rows = np.flatnonzero(~np.isnan(values))
+            n = rows.size - 1
+            if n < OUTLIER_MIN_COUNT:
+                continue
+            x = values[rows]
+            center = x.mean()
+            d = x - center
+            mean = center + (d.sum() - d) / n
+            var = ((d ** 2).sum() - d ** 2 - n * (mean - center) ** 2) / (n - 1)
+            sd = np.maximum(np.sqrt(np.clip(var, 0, None)),
+                            np.maximum(OUTLIER_SD_FLOOR * np.abs(mean), 1e-9))
+            z = (x - mean) / sd
+            hits = np.abs(z) > OUTLIER_Z
+            if hits.any():
+                parts.append(pd.DataFrame({
+                    "Séance": seances[rows][hits], "Date": dates[rows][hits],
+                    "Exercice": base, "Champ": field, "Valeur": x[hits],
+                    "Moyenne": mean[hits].round(1), "z": z[hits].round(1),
+                }))
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(parts, ignore_index=True)
+    return df.iloc[df["z"].abs().sort_values(ascending=False, kind="stable").index].reset_index(drop=True)
 
-    best_squat = safe_nanmax(squat_1rm)
-    best_bench = safe_nanmax(bench_1rm)
-    best_dead = safe_nanmax(dead_1rm)
 
-    sq_target = 220.0
-    bp_target = 160.0
-    dl_target = 260.0
+# ======================
+# ANALYSES EN ARRIÈRE-PLAN
+# ======================
 
-    str_squat = min(best_squat / sq_target, 1.3) if sq_target > 0 else 0
-    str_bench = min(best_bench / bp_target, 1.3) if bp_target > 0 else 0
-    str_dead = min(best_dead / dl_target, 1.3) if dl_target > 0 else 0
+@st.cache_resource
+def _analytics_store():
+    """Analyses publiées par fichier :
+    {data_path: {"fingerprint", "df_all", "sessions", "fatigue", "sah", "last_session"}}.
+    """
+    return {}
 
-    strength_index = float(np.mean([str_squat, str_bench, str_dead]) * 100.0)
 
-    details = {
-        "Squat1RM": round(best_squat, 1),
-        "Bench1RM": round(best_bench, 1),
-        "Dead1RM": round(best_dead, 1),
-        "StrengthIndex": round(strength_index, 1),
+@timed
+def compute_analytics(data_path: Path):
+    """Toutes les analyses de séances : tableau des séances (mmap) et résultats
+    dérivés (cache partagé entre répliques).
+    """
+    fingerprint = data_fingerprint(data_path)
+    return {
+        "fingerprint": fingerprint,
+        "df_all": load_all_sessions_wide(data_path),
+        **session_analytics(data_path),
     }
 
-    hspu_reps = _to_float(df_all.get("HSPU (reps)"))
-    mu_reps = _to_float(df_all.get("Muscle-up (reps)"))
-    t_lest_kg = _to_float(df_all.get("Tractions lestées (kg)"))
 
-    best_hspu = safe_nanmax(hspu_reps)
-    best_mu = safe_nanmax(mu_reps)
-    best_tlest = safe_nanmax(t_lest_kg)
+@shared_cached
+def session_analytics(data_path: Path):
+    """Résultats dérivés des séances en une seule lecture des feuilles Seance_*."""
+    df_all = load_all_sessions_wide(data_path)
+    df_s = session_loads(df_all)
+    return {
+        "sessions": df_s,
+        "fatigue": fatigue_from_sessions(df_s),
+        "sah": sah_from_sessions(load_all_sessions_wide(data_path, archived=True)),
+        "last_session": last_session_from(df_s),
+    }
 
-    details.update({
-        "HSPU": best_hspu,
-        "MU": best_mu,
-        "TractionLestee": best_tlest,
-    })
 
-    hspu_target = 20.0
-    mu_target = 10.0
-    tlest_target = 80.0
+def get_analytics(data_path: Path):
+    """Analyses à jour : celles publiées par le worker si le fichier n'a pas
+    changé depuis, sinon calcul immédiat (et publication).
+    """
+    store = _analytics_store()
+    key = str(data_path)
+    with store_lock():
+        entry = store.get(key)
+    if entry is None or entry["fingerprint"] != data_fingerprint(data_path):
+        entry = compute_analytics(data_path)
+        with store_lock():
+            store[key] = entry
+    return entry
+
+
+class AnalyticsWorker:
+    """Thread de fond prévenu par les sauvegardes : recalcule RPE_DATABASE (si
+    demandé) puis les analyses, et les publie dans _analytics_store.
+    Les notifications en attente sont regroupées par fichier. Chaque lot est
+    traité par self.process, rebranché à chaque rerun par analytics_worker()
+    (le worker survit aux reruns, les fonctions du module sont redéfinies).
+    """
 
-    s_hspu = min(best_hspu / hspu_target, 1.3) if hspu_target > 0 else 0
-    s_mu = min(best_mu / mu_target, 1.3) if mu_target > 0 else 0
-    s_tlest = min(best_tlest / tlest_target, 1.3) if tlest_target > 0 else 0
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.busy = False
+        self.last_error = None
+        self.process = None
+        self.thread = threading.Thread(target=self._run, name=ANALYTICS_THREAD, daemon=True)
+        self.thread.start()
+
+    def notify(self, data_path, rpe=False, changed=None):
+        with self.lock:
+            self.busy = True
+            self.jobs.put((str(data_path), rpe, None if changed is None else set(changed)))
+
+    def _run(self):
+        while True:
+            jobs = [self.jobs.get()]
+            while not self.jobs.empty():
+                jobs.append(self.jobs.get_nowait())
+            pending = {}
+            for path, rpe, changed in jobs:
+                prev_rpe, prev_changed = pending.get(path, (False, set()))
+                if rpe:
+                    merged = None if changed is None or prev_changed is None else prev_changed | changed
+                else:
+                    merged = prev_changed
+                pending[path] = (prev_rpe or rpe, merged)
+            for path, (rpe, changed) in pending.items():
+                try:
+                    self.process(Path(path), rpe, changed)
+                    error = None
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                with self.lock:
+                    self.last_error = error
+            with self.lock:
+                self.busy = not self.jobs.empty()
+
+
+def process_analytics(data_path, rpe, changed):
+    """Un lot du worker : RPE_DATABASE (si demandé) puis analyses publiées et
+    caches dérivés réchauffés pour la version courante du fichier.
+    """
+    if rpe:
+        with workbook_lock():
+            wb = load_workbook(data_path)
+            recompute_rpe_database(wb, data_path, changed=changed)
+    analytics = compute_analytics(data_path)
+    with store_lock():
+        _analytics_store()[str(data_path)] = analytics
+    update_leaderboards(data_path, analytics["sah"], analytics["fingerprint"])
+    get_latest_readiness(data_path)
+    volume_cube(data_path)
+    exercise_index(data_path)
+    exercise_stats(data_path)
 
-    skill_index = float(np.mean([s_hspu, s_mu, s_tlest]) * 100.0)
-    power_index = float(np.mean([s_mu, s_tlest]) * 100.0)
 
-    details["SkillIndex"] = round(skill_index, 1)
-    details["PowerIndex"] = round(power_index, 1)
+@st.cache_resource
+def _analytics_worker():
+    """Worker d'analyses unique par process."""
+    return AnalyticsWorker()
 
-    sah_components = [strength_index, skill_index, power_index]
-    weights = [0.4, 0.4, 0.2]
-    sah_v2 = float(np.average(sah_components, weights=weights))
-    sah_v2 = float(np.clip(sah_v2, 0, 100))
-    details["SAH_V2"] = round(sah_v2, 1)
 
-    return sah_v2, details
+def analytics_worker():
+    """Le worker du process, branché sur process_analytics du rerun courant."""
+    worker = _analytics_worker()
+    worker.process = process_analytics
+    return worker
 
 
-def classify_skill_level(skill_index: float):
-    if skill_index is None:
-        return "Inconnu"
-    if skill_index < 30:
-        return "Débutant"
-    if skill_index < 60:
-        return "Intermédiaire"
-    if skill_index < 85:
-        return "Avancé"
-    return "Élite"
+# ======================
+# DASHBOARDS
+# ======================
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets : indices des points à garder (n_out max).
+    Garde le premier et le dernier point, puis dans chaque bucket le point qui
+    forme le plus grand triangle avec le point retenu précédent et la moyenne
+    du bucket suivant (la forme de la courbe est préservée).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], edges[i + 2])
+        else:
+            nxt = slice(n - 1, n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+@timed
+def downsample_frame(df, max_points=MAX_CHART_POINTS):
+    """Réduit un DataFrame (index numérique, une colonne par série) pour st.line_chart.
+    LTTB par série (NaN ignorés) ; on garde l'union des lignes retenues.
+    """
+    if len(df) <= max_points:
+        return df
+    x = np.asarray(df.index, dtype=float)
+    keep = set()
+    for col in df.columns:
+        y = _to_float(df[col]).to_numpy()
+        valid = np.flatnonzero(~np.isnan(y))
+        keep.update(valid[lttb_indices(x[valid], y[valid], max_points)].tolist())
+    return df.iloc[sorted(keep)]
 
 
-def get_latest_readiness(data_path: Path):
-    try:
-        df_life = pd.read_excel(data_path, sheet_name="Lifestyle")
-    except Exception:
-        return None
-    col = None
-    if "Readiness" in df_life.columns:
-        col = "Readiness"
-    elif df_life.shape[1] >= 9:
-        col = df_life.columns[8]
-    if col is None:
-        return None
-    vals = pd.to_numeric(df_life[col], errors="coerce").dropna()
-    if vals.empty:
-        return None
-    return float(vals.iloc[-1])
+def chart_range(df, lo, hi):
+    """Restreint une série/un DataFrame indexé par rang de séance à [lo, hi]."""
+    return df[(df.index >= lo) & (df.index <= hi)]
 
 
-def get_last_session_info(data_path: Path):
-    df_s = compute_session_metrics(data_path)
-    if df_s is None or df_s.empty:
-        return None
-    last = df_s.iloc[-1]
-    return {
-        "Séance": int(last["Séance"]),
-        "Load": float(last["Load"]),
-    }
+CHART_X = "Séance (ordre chronologique)"
 
 
-# ======================
-# DASHBOARDS
-# ======================
+def session_ranks(df_s, df_all):
+    """Rang chronologique (1..n) des séances de df_s et de chaque ligne de df_all.
+    Axe des graphiques : les numéros repartent à chaque saison archivée et un
+    même numéro peut revenir à une autre date, le rang est unique et croissant.
+    """
+    ranks = df_s[["Date", "Séance"]].assign(**{CHART_X: np.arange(1, len(df_s) + 1)})
+    if df_all is None:
+        return ranks, None
+    keys = df_all[["Date", "Séance"]].assign(Date=pd.to_datetime(df_all["Date"]))
+    rows = keys.merge(ranks.assign(Date=pd.to_datetime(ranks["Date"])),
+                      how="left", on=["Date", "Séance"])[CHART_X]
+    return ranks, rows.to_numpy()
+
 
 def page_dashboards():
     st.header("📊 Dashboards – Volume, 1RM, Calisthénie")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
-    df_s = compute_session_metrics(data_path)
+    analytics = get_analytics(data_path)
+    df_s, df_all = analytics["sessions"], analytics["df_all"]
+    long_view = bool(archive_files(data_path)) and st.checkbox("Inclure les saisons archivées")
+    if long_view:
+        df_all = load_all_sessions_wide(data_path, archived=True)
+        df_s = session_loads(df_all)
     if df_s is None or df_s.empty:
         st.info("Aucune séance enregistrée pour l'instant.")
         return
 
+    ranks, row_ranks = session_ranks(df_s, df_all)
+    n = len(ranks)
+    if n > 1:
+        lo, hi = st.slider("Plage de séances (zoom)", 1, n, (1, n))
+    else:
+        lo, hi = 1, n
+    dates = ranks["Date"].iloc[lo - 1:hi].dropna()
+    period = f" Séances {lo} à {hi} : du {dates.min():%d/%m/%Y} au {dates.max():%d/%m/%Y}." \
+        if not dates.empty else ""
+    st.caption(f"Au plus {MAX_CHART_POINTS} points par série : réduis la plage pour plus de détail."
+               + period)
+
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Volume par séance (Load total)")
-        st.line_chart(df_s.set_index("Séance")["Load"])
+        df_load = chart_range(df_s.assign(**{CHART_X: ranks[CHART_X].to_numpy()})
+                              .set_index(CHART_X)[["Load"]], lo, hi)
+        st.line_chart(downsample_frame(df_load)["Load"])
 
-    df_all = load_all_sessions_wide(data_path)
     if df_all is None:
         return
 
-    sq_back_kg = _to_float(df_all.get("Back Squat (kg)"))
-    sq_back_reps = _to_float(df_all.get("Back Squat (reps)"))
-    sq_front_kg = _to_float(df_all.get("Front Squat (wedge) (kg)"))
-    sq_front_reps = _to_float(df_all.get("Front Squat (wedge) (reps)"))
-    bench_kg = _to_float(df_all.get("Développé couché barre / haltères (kg)"))
-    bench_reps = _to_float(df_all.get("Développé couché barre / haltères (reps)"))
-    roman_kg = _to_float(df_all.get("Romanian Deadlift (barre) (kg)"))
-    roman_reps = _to_float(df_all.get("Romanian Deadlift (barre) (reps)"))
-
-    sq1_back = epley(sq_back_kg, sq_back_reps)
-    sq1_front = epley(sq_front_kg, sq_front_reps)
-    if sq1_back.size and sq1_front.size:
-        sq1 = np.nanmax(np.vstack([sq1_back, sq1_front]), axis=0)
-    else:
-        sq1 = sq1_back if sq1_back.size else sq1_front
-
-    bench1 = epley(bench_kg, bench_reps)
-    dead1 = epley(roman_kg, roman_reps)
-
     df_1rm = pd.DataFrame({
-        "Séance": df_all["Séance"],
-        "Squat 1RM": sq1,
-        "Bench 1RM": bench1,
-        "Deadlift 1RM": dead1,
+        CHART_X: row_ranks,
+        "Squat 1RM": role_values(df_all, "squat"),
+        "Bench 1RM": role_values(df_all, "bench"),
+        "Deadlift 1RM": role_values(df_all, "deadlift"),
     }).dropna()
 
     with col2:
         st.subheader("1RM estimées (Epley)")
         if not df_1rm.empty:
-            df_plot = df_1rm.groupby("Séance").max()[["Squat 1RM", "Bench 1RM", "Deadlift 1RM"]]
-            st.line_chart(df_plot)
+            df_plot = df_1rm.groupby(CHART_X).max()[["Squat 1RM", "Bench 1RM", "Deadlift 1RM"]]
+            st.line_chart(downsample_frame(chart_range(df_plot, lo, hi)))
         else:
             st.info("Pas encore assez de données pour estimer les 1RM.")
 
     st.markdown("---")
     st.subheader("Indicateurs Calisthénie")
-    hspu = _to_float(df_all.get("HSPU (reps)"))
-    mu = _to_float(df_all.get("Muscle-up (reps)"))
-    t_lest = _to_float(df_all.get("Tractions lestées (kg)"))
-
     df_cali = pd.DataFrame({
-        "Séance": df_all["Séance"],
-        "HSPU (reps)": hspu,
-        "MU (reps)": mu,
-        "Tractions lestées (kg)": t_lest,
+        CHART_X: row_ranks,
+        "HSPU (reps)": role_values(df_all, "hspu", "reps"),
+        "MU (reps)": role_values(df_all, "muscle_up", "reps"),
+        "Tractions lestées (kg)": role_values(df_all, "weighted_pullup", "kg"),
     }).dropna(how="all", subset=["HSPU (reps)", "MU (reps)", "Tractions lestées (kg)"])
 
     if df_cali.empty:
         st.info("Pas encore de données calisthénie.")
     else:
-        st.line_chart(df_cali.set_index("Séance"))
+        st.line_chart(downsample_frame(chart_range(df_cali.set_index(CHART_X).sort_index(kind="stable"), lo, hi)))
+
+    st.markdown("---")
+    st.subheader("Volume hebdomadaire par catégorie")
+    cube = dict(volume_cube(data_path))
+    if long_view:
+        cube_add(cube, archive_volume_cube(data_path))
+    weekly = cube_frame(cube, by=("Semaine", "Catégorie")).dropna(subset=["Semaine"])
+    if weekly.empty:
+        st.info("Pas encore de séances datées.")
+        return
+
+    measure = st.selectbox("Mesure", CUBE_MEASURES, index=1)
+    st.line_chart(weekly.pivot(index="Semaine", columns="Catégorie", values=measure).fillna(0))
+
+    weeks = sorted(weekly["Semaine"].unique())
+    n_weeks = st.slider("Volume par exercice : dernières semaines", 1, len(weeks),
+                        min(4, len(weeks))) if len(weeks) > 1 else 1
+    per_ex = cube_frame(cube, by=("Catégorie", "Exercice"), start=weeks[-n_weeks])
+    st.dataframe(per_ex.sort_values(measure, ascending=False), hide_index=True,
+                 width="stretch")
 
 
 # ======================
@@ -855,9 +3316,9 @@ def page_dashboards():
 def page_pr_sah():
     st.header("🏆 PR & Score Athlète Hybride V2")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
-    sah_v2, details = compute_sah_v2(data_path)
+    sah_v2, details = get_analytics(data_path)["sah"]
 
     if sah_v2 is None:
         st.info("Pas encore assez de données (séances) pour calculer un SAH V2.")
@@ -875,6 +3336,391 @@ def page_pr_sah():
         st.json(details)
 
 
+# ======================
+# CLASSEMENTS MULTI-ATHLÈTES
+# ======================
+# Index de classement dans la base du cache partagé : une ligne par (métrique,
+# athlète), remplacée quand une sauvegarde de l'athlète est analysée par le
+# worker ; un classement se lit en O(k) sans rouvrir aucun classeur.
+
+# Métriques classées : {libellé: clé des détails SAH V2 (sah_from_sessions)}
+LEADERBOARD_METRICS = {
+    "SAH V2": "SAH_V2",
+    "Squat 1RM (kg)": "Squat1RM",
+    "Bench 1RM (kg)": "Bench1RM",
+    "Deadlift 1RM (kg)": "Dead1RM",
+    "HSPU (reps)": "HSPU",
+    "Tractions lestées (kg)": "TractionLestee",
+}
+
+
+def leaderboard_bests(sah):
+    """{métrique: valeur} d'un résultat SAH V2 (sah_v2, détails) ; les métriques
+    sans donnée (0) ne sont pas classées.
+    """
+    sah_v2, details = sah
+    if sah_v2 is None:
+        return {}
+    return {metric: float(details[key]) for metric, key in LEADERBOARD_METRICS.items()
+            if details.get(key)}
+
+
+def update_leaderboards(data_path, sah, fingerprint):
+    """Reporte les records d'un athlète (SAH V2 de la version `fingerprint` de
+    son fichier) dans l'index des classements, sauf si le fichier a changé depuis.
+    """
+    if data_fingerprint(data_path) != fingerprint:
+        return
+    shared_cache().put_bests(athlete_id(data_path), fingerprint, leaderboard_bests(sah))
+
+
+@timed
+def refresh_leaderboards():
+    """Rattrapage complet : recalcule les records des athlètes dont le fichier
+    a changé hors de l'app (ou jamais classés) et retire ceux qui n'existent plus.
+    """
+    cache = shared_cache()
+    known = cache.bests_fingerprints()
+    athletes = list_athletes()
+    for athlete, path in athletes.items():
+        fingerprint = data_fingerprint(path)
+        if known.get(athlete) != fingerprint:
+            update_leaderboards(path, compute_sah_v2(path), fingerprint)
+    for athlete in set(known) - set(athletes):
+        cache.drop_bests(athlete)
+
+
+def page_leaderboards():
+    st.header("🥇 Classements multi-athlètes")
+    st.caption(f"Athlètes : `{DATA_FILE}` et les classeurs de `{ATHLETES_DIR}/`. Classements "
+               "mis à jour à chaque sauvegarde analysée ; la resynchronisation reprend les "
+               "classeurs modifiés hors de l'app.")
+
+    cache = shared_cache()
+    resync = st.button("🔄 Resynchroniser les athlètes")
+    k = st.select_slider("Athlètes par classement", options=[3, 5, 10, 20, 50],
+                         value=LEADERBOARD_SIZE)
+    if resync or not cache.bests_indexed():
+        refresh_leaderboards()
+    boards = {metric: cache.top(metric, k) for metric in LEADERBOARD_METRICS}
+
+    cols = st.columns(2)
+    for i, (metric, rows) in enumerate(boards.items()):
+        with cols[i % 2]:
+            st.subheader(metric)
+            if not rows:
+                st.info("Aucun athlète classé.")
+                continue
+            board = pd.DataFrame(rows, columns=["Athlète", metric])
+            board.index = pd.RangeIndex(1, len(board) + 1, name="Rang")
+            st.dataframe(board)
+
+
+# ======================
+# PROJECTION FATIGUE / READINESS (MONTE CARLO)
+# ======================
+
+# Historique injecté avant la projection pour amorcer les fenêtres glissantes
+# (la plus longue est la charge chronique sur 28 jours).
+PROJECTION_HISTORY_DAYS = 28
+
+
+def mesocycle_plan(data_path: Path):
+    """Plan hebdomadaire par défaut tiré de la feuille Mésocycle-Type :
+    Semaine, Type, Volume (% de la charge de séance habituelle), Séances.
+    """
+    df = read_sheet_evaluated(data_path, "Mésocycle-Type").dropna(subset=["Semaine"])
+    return pd.DataFrame({
+        "Semaine": df["Semaine"].astype(str).to_numpy(),
+        "Type": df["Type"].fillna("").astype(str).to_numpy(),
+        "Volume (%)": [PROJECTION_VOLUME.get(v, 100) for v in df["Volume Cible"]],
+        "Séances": PROJECTION_SESSIONS_PER_WEEK,
+    })
+
+
+def planned_daily_loads(plan, base_load, cycles=1):
+    """Charge prévue par jour (0 = repos) : chaque semaine du plan place
+    `Séances` séances à `Volume (%)` de base_load, réparties sur les 7 jours.
+    """
+    weeks = []
+    volumes = pd.to_numeric(plan["Volume (%)"], errors="coerce").fillna(0)
+    sessions = pd.to_numeric(plan["Séances"], errors="coerce").fillna(0)
+    for volume, n in zip(volumes, sessions.clip(0, 7).astype(int)):
+        week = np.zeros(7)
+        if n:
+            week[np.arange(n) * 7 // n] = base_load * volume / 100
+        weeks.append(week)
+    if not weeks:
+        return np.zeros(0)
+    return np.tile(np.concatenate(weeks), cycles)
+
+
+def projection_inputs(data_path: Path, start):
+    """Paramètres estimés sur l'historique, ou None sans séance :
+    charges par jour des PROJECTION_HISTORY_DAYS jours avant `start` (nombre,
+    somme, somme des carrés), charge de séance de référence (médiane des
+    28 derniers jours) et son CV, readiness moyen et écart-type.
+    """
+    df_s = get_analytics(data_path)["sessions"]
+    if df_s is None or df_s.empty:
+        return None
+
+    days = PROJECTION_HISTORY_DAYS
+    count, total, squares = np.zeros(days), np.zeros(days), np.zeros(days)
+    loads = df_s["Load"].to_numpy(dtype=float)
+    index = TimeIndex(df_s["Date"])
+    if len(index):
+        offset = (index.days - np.datetime64(start, "D")).astype(int) + days
+        keep = (offset >= 0) & (offset < days)
+        recent = loads[index.rows[keep]]
+        np.add.at(count, offset[keep], 1)
+        np.add.at(total, offset[keep], recent)
+        np.add.at(squares, offset[keep], recent ** 2)
+        recent = loads[index.last_days(days)]
+    else:
+        recent = loads[-12:]
+
+    base_load = float(np.median(recent))
+    load_cv = float(np.std(recent) / np.mean(recent)) if len(recent) > 1 and np.mean(recent) > 0 else 0.2
+    if not count.any():
+        # Pas de séance datée récente : historique supposé régulier à la charge
+        # de référence, plutôt qu'une reprise après 28 jours d'arrêt.
+        n = PROJECTION_SESSIONS_PER_WEEK
+        count[np.arange(n * days // 7) * 7 // n] = 1
+        total = count * base_load
+        squares = count * base_load ** 2
+
+    readiness_base, readiness_sd = 60.0, 10.0
+    vals, r_index = lifestyle_readiness(data_path)
+    if vals is not None and not vals.empty:
+        window = vals.iloc[r_index.last_days(days)] if len(r_index) else vals.tail(days)
+        readiness_base = float(window.mean())
+        if len(window) > 1:
+            readiness_sd = float(window.std(ddof=0))
+
+    return {
+        "history": (count, total, squares),
+        "base_load": base_load,
+        "load_cv": min(max(load_cv, 0.05), 0.6),
+        "readiness_base": readiness_base,
+        "readiness_sd": max(readiness_sd, 1.0),
+    }
+
+
+def _rolling_sum(a, window, days):
+    """Sommes glissantes sur `window` colonnes, pour les `days` dernières colonnes."""
+    c = np.cumsum(a, axis=1)
+    c = np.concatenate([np.zeros((a.shape[0], 1)), c], axis=1)
+    return (c[:, window:] - c[:, :-window])[:, -days:]
+
+
+@timed
+def project_fatigue(history, planned, base_load, load_cv, readiness_base, readiness_sd,
+                    runs=PROJECTION_RUNS, window=7, seed=0):
+    """Monte Carlo en un seul passage NumPy : `runs` trajectoires de la charge
+    réalisée (charge prévue × bruit log-normal de CV load_cv), évaluées jour par
+    jour sur toute la matrice trajectoires × jours.
+
+    Charge moyenne, monotony et strain suivent fatigue_from_sessions (séances
+    des `window` derniers jours calendaires). Le readiness part du niveau
+    habituel et baisse de PROJECTION_ACWR_PENALTY par point d'ACWR au-delà
+    de 1, avec un bruit journalier d'écart-type readiness_sd.
+    Retourne {métrique: tableau runs × jours}.
+    """
+    rng = np.random.default_rng(seed)
+    days = len(planned)
+    count_h, total_h, squares_h = (np.broadcast_to(h, (runs, len(h))) for h in history)
+
+    sigma = np.sqrt(np.log1p(load_cv ** 2))
+    loads = planned * rng.lognormal(-sigma ** 2 / 2, sigma, size=(runs, days))
+    count = np.concatenate([count_h, np.broadcast_to(planned > 0, (runs, days))], axis=1)
+    total = np.concatenate([total_h, loads], axis=1)
+    squares = np.concatenate([squares_h, loads ** 2], axis=1)
+
+    n = _rolling_sum(count, window, days)
+    mean = np.divide(_rolling_sum(total, window, days), n, out=np.zeros((runs, days)), where=n > 0)
+    var = np.divide(_rolling_sum(squares, window, days), n, out=np.zeros((runs, days)), where=n > 0)
+    std = np.sqrt(np.maximum(var - mean ** 2, 0))
+    # Écart-type nul (séance unique, charges identiques) : monotony 0 comme
+    # fatigue_from_sessions, sans se laisser piéger par l'arrondi des sommes.
+    monotony = np.divide(mean, std, out=np.zeros((runs, days)), where=std > 1e-6 * mean)
+    strain = mean * monotony
+
+    acute = _rolling_sum(total, 7, days) / 7
+    chronic = _rolling_sum(total, 28, days) / 28
+    acwr = np.divide(acute, chronic, out=np.ones((runs, days)), where=chronic > 0)
+    readiness = (readiness_base - PROJECTION_ACWR_PENALTY * np.maximum(acwr - 1, 0)
+                 + rng.normal(0, readiness_sd, size=(runs, days)))
+
+    return {
+        "Charge moyenne": mean,
+        "Monotony": monotony,
+        "Strain": strain,
+        "Readiness": np.clip(readiness, 0, 100),
+    }
+
+
+def projection_bands(values, start, quantiles=(10, 50, 90)):
+    """Percentiles par jour d'un tableau trajectoires × jours (index : dates)."""
+    bands = np.percentile(values, quantiles, axis=0).T
+    dates = pd.date_range(start, periods=values.shape[1], freq="D")
+    return pd.DataFrame(bands, index=dates, columns=[f"P{q}" for q in quantiles])
+
+
+def projection_risk(result, plan, cycles):
+    """Par semaine projetée : part des trajectoires atteignant un strain élevé
+    (≥ 25000, seuil de l'Auto-Séance) et part des jours en readiness bas (< 40).
+    """
+    weeks = result["Strain"].shape[1] // 7
+    strain = result["Strain"][:, :weeks * 7].reshape(-1, weeks, 7)
+    readiness = result["Readiness"][:, :weeks * 7].reshape(-1, weeks, 7)
+    labels = [f"C{c + 1} {w}" if cycles > 1 else str(w)
+              for c in range(cycles) for w in plan["Semaine"]]
+    return pd.DataFrame({
+        "Semaine": labels[:weeks],
+        "Strain élevé (% trajectoires)": (strain.max(axis=2) >= 25000).mean(axis=0) * 100,
+        "Readiness bas (% jours)": (readiness < 40).mean(axis=(0, 2)) * 100,
+    }).round(1)
+
+
+# ======================
+# AUTO-MÉSOCYCLE : PRESCRIPTIONS DE L'ANNÉE
+# ======================
+
+def read_year_plan(data_path: Path):
+    """(mois, semaines) : [(mois, type de mésocycle)] du Plan Annuel et
+    [(semaine, type, volume cible, intensité cible)] du Mésocycle-Type.
+    """
+    annuel = read_sheet_evaluated(data_path, "Plan Annuel").dropna(subset=["Mois"])
+    meso = read_sheet_evaluated(data_path, "Mésocycle-Type").dropna(subset=["Semaine"])
+    months = list(zip(annuel["Mois"].astype(str), annuel["Type de Mésocycle"].fillna("")))
+    weeks = list(meso[["Semaine", "Type", "Volume Cible", "Intensité Cible"]]
+                 .itertuples(index=False, name=None))
+    return months, weeks
+
+
+def build_auto_mesocycle(months, weeks, rpe_index):
+    """Prescriptions de toute l'année en une matrice (mois x semaines) x exercices.
+    Chaque semaine a ses reps (MESO_REPS) et son RPE (MESO_RPE + décalage du
+    mois) ; kg = e1RM x %RTS(reps, RPE) arrondi au 0,5 kg (charge réalisable),
+    reps / sec = max x RPE / 10. Exercice sans max : NaN.
+    """
+    rows = []
+    for month, month_type in months:
+        for week, week_type, volume, intensity in weeks:
+            rpe = MESO_RPE.get(intensity, 8) + MESO_MONTH_RPE_SHIFT.get(month_type, 0)
+            rows.append((month, month_type, week, week_type, MESO_REPS.get(volume, 5),
+                         min(max(rpe, RPE_LEVELS[0]), RPE_LEVELS[-1])))
+    plan = pd.DataFrame(rows, columns=["Mois", "Type mois", "Semaine", "Type", "Reps", "RPE"])
+
+    exercises = list(rpe_index)
+    units = np.array([rpe_index[ex]["Unit"] for ex in exercises])
+    maxes = np.array([rpe_entry_row(rpe_index[ex], 1).get(10) for ex in exercises], dtype=float)
+    reps = plan["Reps"].to_numpy(dtype=float)
+    rpes = plan["RPE"].to_numpy(dtype=float)
+
+    kg = np.round(maxes[None, :] * rts_percentage(reps, rpes)[:, None] * 2) / 2
+    other = np.round(maxes[None, :] * (rpes / 10)[:, None])
+    return {
+        "plan": plan,
+        "exercises": {ex: i for i, ex in enumerate(exercises)},
+        "units": units,
+        "values": np.where(units[None, :] == "kg", kg, other),
+    }
+
+
+@st.cache_resource
+def _auto_mesocycle_store():
+    """Prescriptions en mémoire : {data_path: (empreinte du fichier, prescriptions)}."""
+    return {}
+
+
+@shared_cached
+def auto_mesocycle(data_path: Path):
+    try:
+        months, weeks = read_year_plan(data_path)
+    except Exception:
+        return None
+    if not months or not weeks:
+        return None
+    return build_auto_mesocycle(months, weeks, get_rpe_index(data_path))
+
+
+@timed
+def get_auto_mesocycle(data_path: Path):
+    """Prescriptions de la version courante du fichier (None sans Plan Annuel ou
+    Mésocycle-Type). Recalculées quand le fichier change hors des saisies de
+    séance et Lifestyle (examen RPE, plan modifié dans Excel...).
+    """
+    store = _auto_mesocycle_store()
+    key = str(data_path)
+    fingerprint = data_fingerprint(data_path)
+    with store_lock():
+        cached = store.get(key)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, auto_mesocycle(data_path))
+        with store_lock():
+            store[key] = cached
+    return cached[1]
+
+
+def carry_auto_mesocycle(data_path, before_fingerprint):
+    """Après une saisie qui ne touche ni le plan ni RPE_DATABASE : les
+    prescriptions de la version précédente du fichier restent valables pour la
+    nouvelle (sans relire les feuilles du plan ni dépickler le résultat).
+    """
+    fingerprint = data_fingerprint(data_path)
+    shared_cache().rekey(athlete_id(data_path), auto_mesocycle.__name__,
+                         before_fingerprint, fingerprint)
+    store = _auto_mesocycle_store()
+    with store_lock():
+        cached = store.get(str(data_path))
+        if cached is not None and cached[0] == before_fingerprint:
+            store[str(data_path)] = (fingerprint, cached[1])
+
+
+def _month_number(name):
+    """1-12 d'après le nom français du mois (casse et accents ignorés), sinon None."""
+    def plain(text):
+        return "".join(c for c in unicodedata.normalize("NFKD", text)
+                       if not unicodedata.combining(c))
+    key = plain(str(name).strip().lower())
+    for i, month in enumerate(MONTHS_FR, start=1):
+        if plain(month) == key:
+            return i
+    return None
+
+
+def mesocycle_week(meso, day):
+    """Ligne du plan couvrant la date `day` : bloc du mois de `day` dans le Plan
+    Annuel, retrouvé par son nom (un plan de saison peut commencer en
+    septembre), puis semaine du mois (jours 1-7 = S1, ..., dernière semaine
+    jusqu'à la fin du mois). None si le mois n'est pas au plan.
+    """
+    months = [_month_number(m) for m in meso["plan"]["Mois"]]
+    if day.month not in months:
+        return None
+    start = months.index(day.month)
+    end = start
+    while end < len(months) and months[end] == day.month:
+        end += 1
+    return start + min((day.day - 1) // 7, end - start - 1)
+
+
+def prescription_for(meso, row, ex):
+    """(kg, reps, sec) prescrits pour `ex` sur la ligne `row` du plan, ou None."""
+    col = meso["exercises"].get(ex)
+    if col is None or np.isnan(meso["values"][row, col]):
+        return None
+    value = float(meso["values"][row, col])
+    unit = meso["units"][col]
+    if unit == "kg":
+        return value, int(meso["plan"]["Reps"].iloc[row]), None
+    if unit == "sec":
+        return None, None, int(value)
+    return None, int(value), None
+
+
 # ======================
 # PLANNING & SYNTHÈSE
 # ======================
@@ -882,11 +3728,11 @@ def page_pr_sah():
 def page_planning():
     st.header("📅 Planning – Plan Annuel & Mésocycles")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
     col1, col2 = st.columns(2)
     try:
-        df_annuel = pd.read_excel(data_path, sheet_name="Plan Annuel")
+        df_annuel = read_sheet_evaluated(data_path, "Plan Annuel")
         with col1:
             st.subheader("Plan Annuel")
             st.dataframe(df_annuel)
@@ -894,7 +3740,7 @@ def page_planning():
         st.warning(f"Erreur lecture Plan Annuel : {e}")
 
     try:
-        df_meso = pd.read_excel(data_path, sheet_name="Mésocycle-Type")
+        df_meso = read_sheet_evaluated(data_path, "Mésocycle-Type")
         with col2:
             st.subheader("Mésocycle-Type")
             st.dataframe(df_meso)
@@ -903,44 +3749,86 @@ def page_planning():
 
     st.markdown("---")
     try:
-        df_auto_meso = pd.read_excel(data_path, sheet_name="Auto-Mesocycles")
+        df_auto_meso = read_sheet_evaluated(data_path, "Auto-Mesocycles")
         st.subheader("Auto-Mesocycles")
         st.dataframe(df_auto_meso)
     except Exception as e:
         st.warning(f"Erreur lecture Auto-Mesocycles : {e}")
 
+    st.markdown("---")
+    st.subheader("🗓️ Prescriptions de l'année (Auto-Mésocycle)")
+    meso = get_auto_mesocycle(data_path)
+    if meso is None:
+        st.info("Plan Annuel ou Mésocycle-Type illisible ou vide : pas de prescriptions.")
+    else:
+        st.caption("Charges cibles par semaine à partir de tes max RPE_DATABASE (kg x reps de "
+                   "la semaine, ou reps / sec). Elles sont proposées sur les pages de séance.")
+        category = st.selectbox("Catégorie", list(SESSION_SHEETS), key="meso_category")
+        exos = EXERCISES["categories"][category]["exercises"]
+        cols = [ex for ex in exos if ex in meso["exercises"]]
+        table = meso["plan"][["Mois", "Semaine", "Type", "Reps", "RPE"]].copy()
+        values = meso["values"][:, [meso["exercises"][ex] for ex in cols]]
+        table = pd.concat([table, pd.DataFrame(values, columns=cols)], axis=1)
+        st.dataframe(table, hide_index=True)
+
+    st.markdown("---")
+    st.subheader("🔮 Projection fatigue / readiness")
+    st.caption("Distribution simulée de la charge, du strain et du readiness si le plan "
+               "ci-dessous est suivi, à partir de ta charge et de ton readiness habituels.")
+    start = date.today()
+    inputs = projection_inputs(data_path, start)
+    if inputs is None:
+        st.info("Pas encore de séance enregistrée : impossible d'estimer ta charge habituelle.")
+        return
+    try:
+        default_plan = mesocycle_plan(data_path)
+    except Exception as e:
+        st.warning(f"Erreur lecture Mésocycle-Type : {e}")
+        return
+
+    plan = st.data_editor(default_plan, num_rows="dynamic", hide_index=True,
+                          key="projection_plan")
+    col1, col2 = st.columns(2)
+    cycles = col1.number_input("Répétitions du mésocycle", min_value=1, max_value=6, value=2)
+    runs = col2.select_slider("Trajectoires simulées", options=[500, 1000, 2000, 5000],
+                              value=PROJECTION_RUNS)
+    planned = planned_daily_loads(plan, inputs["base_load"], int(cycles))
+    if not planned.any():
+        st.info("Le plan ne contient aucune séance.")
+        return
+
+    result = project_fatigue(inputs["history"], planned, inputs["base_load"], inputs["load_cv"],
+                             inputs["readiness_base"], inputs["readiness_sd"], runs=runs)
+    st.caption(f"Charge de séance de référence : {int(inputs['base_load'])} "
+               f"(CV {inputs['load_cv']:.0%}) – readiness habituel : "
+               f"{inputs['readiness_base']:.0f} ± {inputs['readiness_sd']:.0f}. "
+               "Bandes : percentiles 10 / 50 / 90.")
+    cols = st.columns(2)
+    for i, (metric, values) in enumerate(result.items()):
+        with cols[i % 2]:
+            st.markdown(f"**{metric}**")
+            st.line_chart(projection_bands(values, start))
+    st.dataframe(projection_risk(result, plan, int(cycles)), hide_index=True)
+
 
 def page_reco_global():
     st.header("🧠 Synthèse & Recommandations globales")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
-    try:
-        df_life = pd.read_excel(data_path, sheet_name="Lifestyle")
-        if "Readiness" in df_life.columns:
-            col = "Readiness"
-        elif df_life.shape[1] >= 9:
-            col = df_life.columns[8]
-        else:
-            col = None
-        if col:
-            vals = pd.to_numeric(df_life[col], errors="coerce").dropna()
-            readiness_moy = float(vals.mean()) if not vals.empty else None
-        else:
-            readiness_moy = None
-    except Exception:
-        readiness_moy = None
+    readiness_moy = get_readiness_mean(data_path)
 
-    mean_load, monotony, strain = compute_fatigue_metrics(data_path)
-    sah_v2, sah_details = compute_sah_v2(data_path)
+    analytics = get_analytics(data_path)
+    mean_load, monotony, strain = analytics["fatigue"]
+    sah_v2, sah_details = analytics["sah"]
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Readiness moyen", value=round(readiness_moy, 1) if readiness_moy is not None else "N/A")
+        st.metric("Readiness moyen (7 derniers jours)", value=round(readiness_moy, 1) if readiness_moy is not None else "N/A")
     with col2:
-        st.metric("Charge moyenne (7 dernières séances)", value=int(mean_load) if mean_load is not None else "N/A")
+        st.metric("Charge moyenne (7 derniers jours)", value=int(mean_load) if mean_load is not None else "N/A")
     with col3:
-        st.metric("Strain (7 dernières séances)", value=int(strain) if strain is not None else "N/A")
+        st.metric("Strain (7 derniers jours)", value=int(strain) if strain is not None else "N/A")
 
     col4, col5 = st.columns(2)
     with col4:
@@ -967,11 +3855,220 @@ def page_reco_global():
 # AUTO-SÉANCE INTELLIGENTE
 # ======================
 
+# Table de décision : zones de readiness (dernier jour) et de strain (7 jours),
+# orientation du bloc, puis règles évaluées dans l'ordre (la première qui
+# correspond gagne, "*" = toutes valeurs) vers un modèle de séance.
+READINESS_ZONES = ("Low", "Medium", "High")
+READINESS_BOUNDS = (40, 70)
+STRAIN_ZONES = ("Low", "Medium", "High")
+STRAIN_BOUNDS = (10000, 25000)
+BLOCK_FOCUS = {
+    "Force maximale": "Force",
+    "Hypertrophie / Volume": "Volume",
+    "Skill / Calisthénie": "Skill",
+    "Puissance / Explosivité": "Power",
+    "Déload / Gestion fatigue": "Deload",
+}
+PRIMARY_FOCUS = ("Force", "Volume", "Skill", "Power", "Deload")
+RECO_RULES = [
+    # (readiness, strain, orientation, modèle de séance)
+    ("Low", "*", "Deload", "recovery"),
+    ("*", "High", "Deload", "recovery"),
+    ("Low", "*", "*", "skill_recovery"),
+    ("*", "High", "*", "skill_recovery"),
+    ("*", "*", "Force", "heavy_strength"),
+    ("*", "*", "Volume", "volume"),
+    ("*", "*", "Skill", "skill"),
+    ("*", "*", "Power", "power"),
+    ("*", "*", "*", "deload"),
+]
+SESSION_TEMPLATES = {
+    "recovery": {
+        "session_type": "Recovery / Off",
+        "focus": "Récupération globale",
+        "intensity": "Très basse",
+        "volume_mod": "20–40% du volume habituel",
+        "rpe_target": "RPE 5–6 max",
+        "note": "Fatigue ou strain élevés : privilégier la récupération active.",
+        "structure": [
+            "20–30 min mobilité totale (hanches, épaules, colonne)",
+            "10–20 min marche ou cardio très léger",
+            "Travail technique très propre : handstand hold, supports, respiration",
+            "Sauna / bain chaud / automassage si possible",
+        ],
+    },
+    "skill_recovery": {
+        "session_type": "Skill / Recovery",
+        "focus": "Technique + Calisthénie propre + mobilité",
+        "intensity": "Basse à modérée",
+        "volume_mod": "40–60% du volume habituel",
+        "rpe_target": "RPE 6–7",
+        "note": "Readiness bas ou strain élevé : on garde la fréquence mais on baisse l'impact.",
+        "structure": [
+            "Bloc skill : HSPU, MU, variations progressives",
+            "Volume traction / push modéré, loin de l'échec",
+            "Core & gainage (planche, hollow, arch)",
+            "Long travail de stretching actif / PNF en fin de séance",
+        ],
+    },
+    "heavy_strength": {
+        "session_type": "Heavy Strength",
+        "focus": "Force lourde (1–3 lifts principaux)",
+        "intensity": "Élevée",
+        "volume_mod": "70–90% du volume habituel",
+        "rpe_target": "RPE 8–9 sur les principaux mouvements",
+        "note": "Tu peux pousser lourd sur 1–3 exercices clés.",
+        "structure": [
+            "1–2 mouvements principaux en 3–5 séries lourdes (3–6 reps)",
+            "2–3 accessoires lourds ou modérés (6–10 reps)",
+            "Un peu de skill en fin si énergie",
+            "Mobilité / respiration pour redescendre le système",
+        ],
+    },
+    "volume": {
+        "session_type": "Hypertrophie / Volume",
+        "focus": "Accumulation de volume contrôlé",
+        "intensity": "Modérée",
+        "volume_mod": "90–110% du volume habituel",
+        "rpe_target": "RPE 7–8",
+        "note": "Objectif : congestion et volume sans cramer le système nerveux.",
+        "structure": [
+            "2 mouvements de base en 4×8–12",
+            "3–4 exercices d'isolation (12–20 reps)",
+            "Optionnel : finisher métabolique (farmer walk + burpees)",
+            "Stretching ciblé sur les groupes très travaillés",
+        ],
+    },
+    "skill": {
+        "session_type": "Skill Calisthénie",
+        "focus": "Maîtrise technique (HSPU / MU / équilibres)",
+        "intensity": "Modérée",
+        "volume_mod": "60–80% du volume habituel",
+        "rpe_target": "RPE 6–8, jamais à l'échec nerveux sur le skill",
+        "note": "Niveau skill actuel : {skill_level}. On consolide la technique.",
+        "structure": [
+            "Bloc 1 : MU (progressions, 3–5 reps par série)",
+            "Bloc 2 : HSPU / handstand (négatives, holds, partiels)",
+            "Bloc 3 : tractions / dips / pompes pour volume contrôlé",
+            "Mobility épaules + poignets en fin de séance",
+        ],
+    },
+    "power": {
+        "session_type": "Puissance / Explosivité",
+        "focus": "Sauts, vitesse, intention explosive",
+        "intensity": "Élevée mais volume limité",
+        "volume_mod": "50–70% volume muscu, intensité maximale sur explosif",
+        "rpe_target": "RPE 7–8 (qualité, pas d'échec)",
+        "note": "Objectif : système nerveux rapide, pas cramé.",
+        "structure": [
+            "Sauts (box jumps, broad jumps, 3–5 reps par série)",
+            "Sprints courts / hill sprints si possible",
+            "Un peu de force submax (70–80% 1RM, vitesse d'exécution)",
+            "Mobilité hanches / chevilles",
+        ],
+    },
+    "deload": {
+        "session_type": "Deload intelligent",
+        "focus": "Réduction de charge, maintien technique",
+        "intensity": "Basse à modérée",
+        "volume_mod": "40–60% du volume habituel",
+        "rpe_target": "RPE 6–7",
+        "note": "Bloc orienté gestion fatigue / décharge.",
+        "structure": [
+            "Même structure qu'une séance normale mais -40% en charge/volume",
+            "Travail technique plus propre (tempo, pauses)",
+            "Beaucoup de mobilité / respiration en fin",
+        ],
+    },
+}
+TEMPLATE_KEYS = tuple(SESSION_TEMPLATES)
+# Couleurs de la carte « Et si… ? » (page Auto-Séance), par modèle de séance
+TEMPLATE_COLORS = {
+    "recovery": "#f4b6b6",
+    "skill_recovery": "#f7d59c",
+    "heavy_strength": "#9fc5e8",
+    "volume": "#b6d7a8",
+    "skill": "#d5c4ea",
+    "power": "#f9cb9c",
+    "deload": "#d9d9d9",
+}
+
+
+def build_decision_grid(rules=RECO_RULES):
+    """Compile les règles en grille readiness × strain × orientation d'indices
+    dans TEMPLATE_KEYS. Lève ValueError si un état n'est couvert par aucune règle.
+    """
+    grid = np.full((len(READINESS_ZONES), len(STRAIN_ZONES), len(PRIMARY_FOCUS)), -1)
+    for r, rz in enumerate(READINESS_ZONES):
+        for s, sz in enumerate(STRAIN_ZONES):
+            for f, focus in enumerate(PRIMARY_FOCUS):
+                grid[r, s, f] = next(
+                    (TEMPLATE_KEYS.index(template) for rr, sr, fr, template in rules
+                     if rr in ("*", rz) and sr in ("*", sz) and fr in ("*", focus)), -1)
+                if grid[r, s, f] < 0:
+                    raise ValueError(f"Aucune règle pour {rz} / {sz} / {focus}")
+    return grid
+
+
+@st.cache_resource
+def decision_grid():
+    """Grille de décision compilée une fois par process."""
+    return build_decision_grid()
+
+
+def decision_index(readiness, strain, block_focus):
+    """Indices dans TEMPLATE_KEYS des modèles de séance pour des états d'athlète,
+    vectorisé : readiness, strain et block_focus (libellés de BLOCK_FOCUS ;
+    orientation Deload si inconnu) sont diffusés les uns contre les autres.
+    Readiness manquant = 50, strain manquant = 0.
+    """
+    readiness = np.nan_to_num(np.asarray(readiness, dtype=float), nan=50.0)
+    strain = np.nan_to_num(np.asarray(strain, dtype=float), nan=0.0)
+    focus_codes = {label: PRIMARY_FOCUS.index(primary) for label, primary in BLOCK_FOCUS.items()}
+    codes, labels = pd.factorize(np.asarray(block_focus, dtype=object).ravel())
+    focus = np.array([focus_codes.get(label, PRIMARY_FOCUS.index("Deload"))
+                      for label in labels], dtype=int)[codes].reshape(np.shape(block_focus))
+    return decision_grid()[np.digitize(readiness, READINESS_BOUNDS),
+                           np.digitize(strain, STRAIN_BOUNDS), focus]
+
+
+def recommend_templates(readiness, strain, block_focus):
+    """Clés de SESSION_TEMPLATES recommandées (tableau, cf. decision_index)."""
+    return np.asarray(np.asarray(TEMPLATE_KEYS, dtype=object)[
+        decision_index(readiness, strain, block_focus)], dtype=object)
+
+
+def score_athlete_states(states):
+    """Recommandation pour un lot d'états d'athlète : DataFrame avec les colonnes
+    Readiness, Strain et Objectif (libellé de BLOCK_FOCUS), rendu avec en plus
+    Modèle et Type de séance, sans recalculer aucune métrique.
+    """
+    index = decision_index(states["Readiness"].to_numpy(), states["Strain"].to_numpy(),
+                           states["Objectif"].to_numpy())
+    types = [template["session_type"] for template in SESSION_TEMPLATES.values()]
+    return states.assign(Modèle=np.asarray(TEMPLATE_KEYS, dtype=object)[index],
+                         **{"Type de séance": np.asarray(types, dtype=object)[index]})
+
+
+def what_if_grid(block_focus, readiness=range(0, 101, 5), strain=range(0, 40001, 2500)):
+    """Types de séance sur une grille readiness (lignes, décroissant) × strain
+    (colonnes) pour un objectif de bloc, évaluée en un seul appel.
+    """
+    readiness = np.asarray(list(readiness), dtype=float)[::-1]
+    strain = np.asarray(list(strain), dtype=float)
+    types = np.asarray([template["session_type"] for template in SESSION_TEMPLATES.values()],
+                       dtype=object)[decision_index(readiness[:, None], strain[None, :], block_focus)]
+    return pd.DataFrame(types, index=pd.Index(readiness.astype(int), name="Readiness"),
+                        columns=[f"{int(v)}" for v in strain])
+
+
+@timed
 def compute_auto_seance_recommendation(data_path: Path, block_focus: str):
     readiness = get_latest_readiness(data_path)
-    mean_load, monotony, strain = compute_fatigue_metrics(data_path)
-    sah_v2, details = compute_sah_v2(data_path)
-    last_info = get_last_session_info(data_path)
+    analytics = get_analytics(data_path)
+    mean_load, monotony, strain = analytics["fatigue"]
+    sah_v2, details = analytics["sah"]
+    last_info = analytics["last_session"]
 
     skill_index = details.get("SkillIndex", 0.0)
     strength_index = details.get("StrengthIndex", 0.0)
@@ -987,134 +4084,12 @@ def compute_auto_seance_recommendation(data_path: Path, block_focus: str):
     if strain is None:
         strain = 0.0
 
-    if readiness >= 70:
-        readiness_zone = "High"
-    elif readiness >= 40:
-        readiness_zone = "Medium"
-    else:
-        readiness_zone = "Low"
-
-    if strain >= 25000:
-        strain_zone = "High"
-    elif strain >= 10000:
-        strain_zone = "Medium"
-    else:
-        strain_zone = "Low"
-
-    if block_focus == "Force maximale":
-        primary = "Force"
-    elif block_focus == "Hypertrophie / Volume":
-        primary = "Volume"
-    elif block_focus == "Skill / Calisthénie":
-        primary = "Skill"
-    elif block_focus == "Puissance / Explosivité":
-        primary = "Power"
-    else:
-        primary = "Deload"
-
-    session_type = ""
-    focus = ""
-    intensity = ""
-    volume_mod = ""
-    rpe_target = ""
-    notes = []
-    structure = []
-
-    if readiness_zone == "Low" or strain_zone == "High":
-        if primary == "Deload":
-            session_type = "Recovery / Off"
-            focus = "Récupération globale"
-            intensity = "Très basse"
-            volume_mod = "20–40% du volume habituel"
-            rpe_target = "RPE 5–6 max"
-            notes.append("Fatigue ou strain élevés : privilégier la récupération active.")
-            structure = [
-                "20–30 min mobilité totale (hanches, épaules, colonne)",
-                "10–20 min marche ou cardio très léger",
-                "Travail technique très propre : handstand hold, supports, respiration",
-                "Sauna / bain chaud / automassage si possible",
-            ]
-        else:
-            session_type = "Skill / Recovery"
-            focus = "Technique + Calisthénie propre + mobilité"
-            intensity = "Basse à modérée"
-            volume_mod = "40–60% du volume habituel"
-            rpe_target = "RPE 6–7"
-            notes.append("Readiness bas ou strain élevé : on garde la fréquence mais on baisse l'impact.")
-            structure = [
-                "Bloc skill : HSPU, MU, variations progressives",
-                "Volume traction / push modéré, loin de l'échec",
-                "Core & gainage (planche, hollow, arch)",
-                "Long travail de stretching actif / PNF en fin de séance",
-            ]
-    else:
-        if primary == "Force":
-            session_type = "Heavy Strength"
-            focus = "Force lourde (1–3 lifts principaux)"
-            intensity = "Élevée"
-            volume_mod = "70–90% du volume habituel"
-            rpe_target = "RPE 8–9 sur les principaux mouvements"
-            notes.append("Tu peux pousser lourd sur 1–3 exercices clés.")
-            structure = [
-                "1–2 mouvements principaux en 3–5 séries lourdes (3–6 reps)",
-                "2–3 accessoires lourds ou modérés (6–10 reps)",
-                "Un peu de skill en fin si énergie",
-                "Mobilité / respiration pour redescendre le système",
-            ]
-        elif primary == "Volume":
-            session_type = "Hypertrophie / Volume"
-            focus = "Accumulation de volume contrôlé"
-            intensity = "Modérée"
-            volume_mod = "90–110% du volume habituel"
-            rpe_target = "RPE 7–8"
-            notes.append("Objectif : congestion et volume sans cramer le système nerveux.")
-            structure = [
-                "2 mouvements de base en 4×8–12",
-                "3–4 exercices d'isolation (12–20 reps)",
-                "Optionnel : finisher métabolique (farmer walk + burpees)",
-                "Stretching ciblé sur les groupes très travaillés",
-            ]
-        elif primary == "Skill":
-            session_type = "Skill Calisthénie"
-            focus = "Maîtrise technique (HSPU / MU / équilibres)"
-            intensity = "Modérée"
-            volume_mod = "60–80% du volume habituel"
-            rpe_target = "RPE 6–8, jamais à l'échec nerveux sur le skill"
-            notes.append(f"Niveau skill actuel : {skill_level}. On consolide la technique.")
-            structure = [
-                "Bloc 1 : MU (progressions, 3–5 reps par série)",
-                "Bloc 2 : HSPU / handstand (négatives, holds, partiels)",
-                "Bloc 3 : tractions / dips / pompes pour volume contrôlé",
-                "Mobility épaules + poignets en fin de séance",
-            ]
-        elif primary == "Power":
-            session_type = "Puissance / Explosivité"
-            focus = "Sauts, vitesse, intention explosive"
-            intensity = "Élevée mais volume limité"
-            volume_mod = "50–70% volume muscu, intensité maximale sur explosif"
-            rpe_target = "RPE 7–8 (qualité, pas d'échec)"
-            notes.append("Objectif : système nerveux rapide, pas cramé.")
-            structure = [
-                "Sauts (box jumps, broad jumps, 3–5 reps par série)",
-                "Sprints courts / hill sprints si possible",
-                "Un peu de force submax (70–80% 1RM, vitesse d'exécution)",
-                "Mobilité hanches / chevilles",
-            ]
-        else:
-            session_type = "Deload intelligent"
-            focus = "Réduction de charge, maintien technique"
-            intensity = "Basse à modérée"
-            volume_mod = "40–60% du volume habituel"
-            rpe_target = "RPE 6–7"
-            notes.append("Bloc orienté gestion fatigue / décharge.")
-            structure = [
-                "Même structure qu'une séance normale mais -40% en charge/volume",
-                "Travail technique plus propre (tempo, pauses)",
-                "Beaucoup de mobilité / respiration en fin",
-            ]
+    template = SESSION_TEMPLATES[recommend_templates(readiness, strain, block_focus).item()]
+    notes = [template["note"].format(skill_level=skill_level)]
 
     if last_info is not None:
-        notes.append(f"Dernière séance enregistrée : Séance {last_info['Séance']} – Load {int(last_info['Load'])}.")
+        when = f" du {last_info['Date']:%d/%m/%Y}" if last_info.get("Date") else ""
+        notes.append(f"Dernière séance enregistrée : Séance {last_info['Séance']}{when} – Load {int(last_info['Load'])}.")
 
     return {
         "readiness": readiness,
@@ -1127,37 +4102,28 @@ def compute_auto_seance_recommendation(data_path: Path, block_focus: str):
         "power_index": power_index,
         "skill_level": skill_level,
         "last_session": last_info,
-        "session_type": session_type,
-        "focus": focus,
-        "intensity": intensity,
-        "volume_mod": volume_mod,
-        "rpe_target": rpe_target,
+        "session_type": template["session_type"],
+        "focus": template["focus"],
+        "intensity": template["intensity"],
+        "volume_mod": template["volume_mod"],
+        "rpe_target": template["rpe_target"],
         "notes": notes,
-        "structure_suggestion": structure,
+        "structure_suggestion": list(template["structure"]),
     }
 
 
 def page_auto_seance():
     st.header("🤖 Auto-Séance intelligente – Coach Empereur")
 
-    wb, data_path = get_excel_file(data_only=True)
+    data_path = ensure_data_file()
 
     st.markdown("Cette page te propose un **type de séance du jour** basé sur :")
     st.markdown("- Ta dernière valeur de **Readiness**")
-    st.markdown("- La **charge** et le **strain** des 7 dernières séances")
+    st.markdown("- La **charge** et le **strain** des 7 derniers jours d'entraînement")
     st.markdown("- Ton **niveau Skill** (calisthénie / puissance)")
     st.markdown("- L’**objectif du bloc** que tu choisis")
 
-    block_focus = st.selectbox(
-        "Objectif du bloc en cours",
-        [
-            "Force maximale",
-            "Hypertrophie / Volume",
-            "Skill / Calisthénie",
-            "Puissance / Explosivité",
-            "Déload / Gestion fatigue",
-        ]
-    )
+    block_focus = st.selectbox("Objectif du bloc en cours", list(BLOCK_FOCUS))
 
     if st.button("⚡ Générer la séance recommandée"):
         reco = compute_auto_seance_recommendation(data_path, block_focus)
@@ -1166,7 +4132,7 @@ def page_auto_seance():
         with col1:
             st.metric("Readiness (dernier jour)", value=round(reco["readiness"], 1))
         with col2:
-            st.metric("Strain (7 dernières séances)", value=int(reco["strain"]))
+            st.metric("Strain (7 derniers jours)", value=int(reco["strain"]))
         with col3:
             if reco["sah_v2"] is not None:
                 st.metric("SAH V2", value=round(reco["sah_v2"], 1))
@@ -1208,6 +4174,91 @@ def page_auto_seance():
             for s in reco["structure_suggestion"]:
                 st.write(f"- {s}")
 
+    st.markdown("---")
+    st.subheader("🔮 Et si… ?")
+    st.caption("Séance recommandée pour d'autres valeurs de readiness et de strain, avec "
+               "l'objectif de bloc choisi (table de décision, sans recalcul des métriques).")
+    readiness_now = get_latest_readiness(data_path)
+    strain_now = get_analytics(data_path)["fatigue"][2]
+    col1, col2 = st.columns(2)
+    readiness = col1.slider("Readiness", 0, 100, key="what_if_readiness",
+                            value=int(round(readiness_now if readiness_now is not None else 50)))
+    strain = col2.slider("Strain (7 jours)", 0, max(40000, int(strain_now or 0)), step=500,
+                         key="what_if_strain", value=int(round(strain_now or 0)))
+    template = SESSION_TEMPLATES[recommend_templates(readiness, strain, block_focus).item()]
+    st.write(f"À readiness {readiness} et strain {strain} : **{template['session_type']}** – "
+             f"{template['intensity']}, {template['volume_mod']}, {template['rpe_target']}.")
+    colors = {SESSION_TEMPLATES[k]["session_type"]: c for k, c in TEMPLATE_COLORS.items()}
+    grid = what_if_grid(block_focus)
+    st.dataframe(grid.style.map(lambda t: f"background-color: {colors.get(t, '')}"))
+    st.caption("Lignes : readiness (dernier jour) ; colonnes : strain des 7 derniers jours.")
+
+
+# ======================
+# EXPORT EN FLUX
+# ======================
+
+# Feuilles de saisie exportées pour un export multi-athlètes (les feuilles de
+# calcul du modèle référencent des noms de feuilles non préfixés).
+EXPORT_DATA_SHEETS = ("Lifestyle", "RPE_EXAM", "RPE_DATABASE", *SESSION_SHEETS.values())
+
+
+def _export_title(title, used):
+    """Nom de feuille Excel valide (31 car., sans []:*?/\\) et unique dans `used`."""
+    base = re.sub(r"[\[\]:*?/\\]", "_", title)[:31]
+    title, n = base, 1
+    while title in used:
+        suffix = f"~{n}"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title)
+    return title
+
+
+def _archived_rows(data_path, sheet, header):
+    """Lignes archivées d'une feuille de séance, alignées sur l'en-tête `header`."""
+    for path in archive_files(data_path, sheet):
+        df = pd.read_parquet(path).reindex(columns=list(header)).astype(object)
+        df = df.where(df.notna(), None)
+        for row in df.itertuples(index=False, name=None):
+            yield [v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row]
+
+
+@timed
+def stream_export(sources, include_archives=False, sheets=None):
+    """Construit un xlsx en mode write_only : chaque feuille des classeurs
+    sources (ouverts en read_only) est recopiée ligne par ligne, formules
+    comprises, sans jamais charger un classeur entier en mémoire. Les séances
+    archivées précèdent les séances actives des feuilles Seance_*.
+    sources : {athlète: chemin} ; à plusieurs athlètes, feuilles préfixées.
+    Retourne un fichier temporaire (sur disque) rembobiné.
+    """
+    multi = len(sources) > 1
+    out = Workbook(write_only=True)
+    used = set()
+    for athlete, path in sources.items():
+        src = load_workbook(path, read_only=True)
+        try:
+            for name in src.sheetnames:
+                if sheets is not None and name not in sheets:
+                    continue
+                ws_out = out.create_sheet(_export_title(f"{athlete}-{name}" if multi else name, used))
+                rows = src[name].iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                ws_out.append(header)
+                if include_archives and name in SESSION_SHEETS.values():
+                    for row in _archived_rows(path, name, header):
+                        ws_out.append(row)
+                for row in rows:
+                    ws_out.append(row)
+        finally:
+            src.close()
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    out.save(tmp)
+    tmp.seek(0)
+    return tmp
+
 
 # ======================
 # EXPORT & DEBUG
@@ -1216,11 +4267,11 @@ def page_auto_seance():
 def page_export_debug():
     st.header("📥 Export & Debug des données Empereur")
 
-    wb, data_path = get_excel_file()
+    data_path = ensure_data_file()
 
     st.subheader("Lifestyle – dernières entrées")
     try:
-        df_life = pd.read_excel(data_path, sheet_name="Lifestyle")
+        df_life = read_sheet_evaluated(data_path, "Lifestyle")
         st.dataframe(df_life.tail(10))
     except Exception as e:
         st.warning(f"Impossible de lire Lifestyle : {e}")
@@ -1228,7 +4279,7 @@ def page_export_debug():
     st.markdown("---")
     st.subheader("Séances LEGS – dernières entrées")
     try:
-        df_legs = pd.read_excel(data_path, sheet_name="Seance_Legs")
+        df_legs = read_excel_sheet(data_path, "Seance_Legs")
         st.dataframe(df_legs.tail(10))
     except Exception as e:
         st.warning(f"Impossible de lire Seance_Legs : {e}")
@@ -1236,7 +4287,7 @@ def page_export_debug():
     st.markdown("---")
     st.subheader("Séances PUSH – dernières entrées")
     try:
-        df_push = pd.read_excel(data_path, sheet_name="Seance_Push")
+        df_push = read_excel_sheet(data_path, "Seance_Push")
         st.dataframe(df_push.tail(10))
     except Exception as e:
         st.warning(f"Impossible de lire Seance_Push : {e}")
@@ -1244,7 +4295,7 @@ def page_export_debug():
     st.markdown("---")
     st.subheader("Séances PULL – dernières entrées")
     try:
-        df_pull = pd.read_excel(data_path, sheet_name="Seance_Pull")
+        df_pull = read_excel_sheet(data_path, "Seance_Pull")
         st.dataframe(df_pull.tail(10))
     except Exception as e:
         st.warning(f"Impossible de lire Seance_Pull : {e}")
@@ -1252,7 +4303,7 @@ def page_export_debug():
     st.markdown("---")
     st.subheader("Séances FULL – dernières entrées")
     try:
-        df_full = pd.read_excel(data_path, sheet_name="Seance_Full")
+        df_full = read_excel_sheet(data_path, "Seance_Full")
         st.dataframe(df_full.tail(10))
     except Exception as e:
         st.warning(f"Impossible de lire Seance_Full : {e}")
@@ -1260,52 +4311,121 @@ def page_export_debug():
     st.markdown("---")
     st.subheader("RPE_EXAM & RPE_DATABASE – aperçu")
     try:
-        df_exam = pd.read_excel(data_path, sheet_name="RPE_EXAM")
+        df_exam = read_excel_sheet(data_path, "RPE_EXAM")
         st.write("RPE_EXAM")
         st.dataframe(df_exam.head(20))
     except Exception as e:
         st.warning(f"Impossible de lire RPE_EXAM : {e}")
 
     try:
-        df_db = pd.read_excel(data_path, sheet_name="RPE_DATABASE")
+        df_db = read_excel_sheet(data_path, "RPE_DATABASE")
         st.write("RPE_DATABASE")
         st.dataframe(df_db.head(20))
     except Exception as e:
         st.warning(f"Impossible de lire RPE_DATABASE : {e}")
 
     st.markdown("---")
-    st.subheader("Télécharger le fichier de données complet")
+    st.subheader("🔎 Audit des valeurs aberrantes")
+    st.caption(f"Chaque saisie de l'historique (archives comprises) comparée aux autres saisies "
+               f"du même exercice : signalée au-delà de {OUTLIER_Z:g} écarts-types.")
+    if st.button("🔎 Lancer l'audit"):
+        suspects = audit_outliers(load_all_sessions_wide(data_path, archived=True))
+        if suspects.empty:
+            st.success("Aucune valeur aberrante dans l'historique.")
+        else:
+            st.dataframe(suspects, hide_index=True)
+
+    st.markdown("---")
+    st.subheader("🗄️ Archiver une saison terminée")
+    st.caption("Les séances datées d'avant la date choisie quittent le classeur actif pour une "
+               "archive Parquet compressée. PR, SAH et la vue longue des dashboards les incluent.")
+    files = archive_files(data_path)
+    if files:
+        st.write("Archives : " + ", ".join(f"`{p.name}` ({p.stat().st_size // 1024} Ko)" for p in files))
+    col_cut, col_label = st.columns(2)
+    cutoff = col_cut.date_input("Archiver les séances antérieures au",
+                                value=date(date.today().year, 1, 1))
+    label = col_label.text_input("Nom de la saison", value=f"saison_{cutoff.year - 1}")
+    if st.button("🗄️ Archiver"):
+        with workbook_lock():
+            with edit_workbook(f"Archivage {label}") as (wb, data_path):
+                moved = archive_sessions(wb, data_path, cutoff, label)
+        if moved:
+            st.success("Séances archivées : " + ", ".join(f"{sheet} {n}" for sheet, n in moved.items()))
+        else:
+            st.info("Aucune séance datée avant cette date.")
+
+    st.markdown("---")
+    st.subheader("Télécharger les données")
 
     data_path = Path(DATA_FILE)
     if not data_path.exists():
         st.info("Aucun fichier empereur_data.xlsx trouvé pour l'instant (enregistre d'abord des données).")
     else:
-        with open(data_path, "rb") as f:
-            binary = f.read()
+        athletes = list_athletes()
+        chosen = [athlete_id(data_path)]
+        if len(athletes) > 1:
+            chosen = st.multiselect("Athlètes", list(athletes), default=chosen)
+        with_archives = st.checkbox("Inclure les saisons archivées", value=True)
+        sources = {a: athletes[a] for a in chosen}
+        st.caption("Export généré à la demande, ligne par ligne (valeurs et formules, sans la "
+                   "mise en forme). À plusieurs athlètes : feuilles de saisie préfixées par athlète.")
+
+        def build_export():
+            sheets = EXPORT_DATA_SHEETS if len(sources) > 1 else None
+            return stream_export(sources, include_archives=with_archives, sheets=sheets)
+
+        st.download_button(
+            label="📥 Télécharger l'export",
+            data=build_export,
+            file_name="empereur_export.xlsx" if len(sources) > 1 else "empereur_data.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            disabled=not sources,
+        )
+
+        def read_raw():
+            return data_path.read_bytes()
+
         st.download_button(
-            label="📥 Télécharger empereur_data.xlsx",
-            data=binary,
+            label="📄 Copie brute du fichier de travail (mise en forme incluse)",
+            data=read_raw,
             file_name="empereur_data.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
 
+    st.markdown("---")
+    st.subheader("🕓 Instantanés")
+    st.caption("Un instantané est enregistré à chaque sauvegarde. Seuls les blocs de lignes "
+               "modifiés sont stockés ; tout état précédent peut être restauré.")
+    snapshots = list_snapshots(data_path, limit=200)
+    if not snapshots:
+        st.info("Aucun instantané pour l'instant.")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "Date": snap["created"].replace("T", " "),
+            "Action": snap["label"],
+            "Données nouvelles (Ko)": round(snap["new_bytes"] / 1024, 1),
+        } for snap in snapshots]), hide_index=True)
+        chosen = st.selectbox(
+            "Instantané à restaurer", snapshots,
+            format_func=lambda snap: f"{snap['created'].replace('T', ' ')} – {snap['label']}",
+        )
+        if st.button("⏪ Restaurer cet instantané"):
+            restore_snapshot(data_path, chosen["id"])
+            st.success(f"Données restaurées à l'état du {chosen['created'].replace('T', ' ')}.")
+
     st.markdown("---")
     st.subheader("♻️ Réinitialiser toutes les données")
 
     st.warning(
-        "⚠️ Cette action supprime **toutes** les données actuelles (Lifestyle, Séances, RPE, etc.) "
-        "et recrée un fichier vierge à partir du modèle."
+        "⚠️ Cette action remplace **toutes** les données actuelles (Lifestyle, Séances, RPE, etc.) "
+        "et les saisons archivées par un fichier vierge créé à partir du modèle. "
+        "L'état actuel reste restaurable depuis les instantanés."
     )
 
     if st.button("🔴 Réinitialiser empereur_data.xlsx"):
-        if data_path.exists():
-            data_path.unlink()
-            st.success(
-                "Toutes les données ont été réinitialisées. "
-                "La prochaine utilisation de l'app recréera un fichier vierge à partir du modèle."
-            )
-        else:
-            st.info("Aucun fichier de données à supprimer.")
+        reset_data_file(data_path)
+        st.success("Toutes les données ont été réinitialisées (instantané « Réinitialisation »).")
 
 
 # ======================
@@ -1322,6 +4442,7 @@ PAGES = {
     "SÉANCE FULL": page_seance_full,
     "Dashboards Volume / 1RM / Calisthénie": page_dashboards,
     "PR & SAH V2": page_pr_sah,
+    "Classements multi-athlètes": page_leaderboards,
     "Planning (Annuel / Mésocycles)": page_planning,
     "Synthèse & Recos Globales": page_reco_global,
     "Auto-Séance intelligente": page_auto_seance,
@@ -1336,7 +4457,18 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.write(f"Modèle : `{TEMPLATE_FILE}`")
     st.sidebar.write(f"Données actives : `{DATA_FILE}`")
-    PAGES[choix]()
+    worker = analytics_worker()
+    if worker.busy:
+        st.sidebar.caption("⚙️ Recalcul des analyses en arrière-plan…")
+    if worker.last_error:
+        st.sidebar.warning(f"Recalcul en arrière-plan échoué : {worker.last_error}")
+    profile = st.sidebar.button("🔬 Profiler ce rerun (cProfile)")
+    with perf_span(f"page[{choix}]"):
+        if profile:
+            run_profiled(PAGES[choix])
+        else:
+            PAGES[choix]()
+    perf_panel(choix)
 
 
 if __name__ == "__main__":
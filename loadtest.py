@@ -0,0 +1,370 @@
+"""Test de charge local de l'app Empereur : N utilisateurs simultanés pilotent
+les vraies pages (streamlit.testing AppTest, même process donc mêmes caches et
+même worker qu'un serveur unique) sur des données synthétiques.
+
+Chaque utilisateur navigue au hasard dans les pages, enregistre des Lifestyle
+et des séances (numéros et dates uniques) et génère des Auto-Séances.
+Rapport : latences par page/action (p50/p95/p99/max), débit, erreurs et
+écritures perdues (confirmées à l'écran mais absentes du fichier final).
+
+    python loadtest.py --users 8 --actions 20 --sessions 300
+
+Les utilisateurs sont des threads d'un même process, comme les sessions d'un
+serveur Streamlit. AppTest n'étant pas prévu pour des runs concurrents, le
+harnais remplace quelques internes de Streamlit (ScriptCache, Runtime simulé,
+option global.appTest) : ils sont écrits pour streamlit 1.66.0, version
+épinglée dans requirements.txt ; à revoir à chaque montée de version.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import streamlit
+from openpyxl import load_workbook
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+APP_DIR = Path(__file__).resolve().parent
+APP_FILES = ("app.py", "derivations.json", "exercises.json",
+             "Systeme_Entrainement_Empereur_ULTIME.xlsx")
+TEMPLATE_FILE = "Systeme_Entrainement_Empereur_ULTIME.xlsx"
+DATA_FILE = "empereur_data.xlsx"
+SESSION_PAGES = {
+    "SÉANCE LEGS": "Seance_Legs",
+    "SÉANCE PUSH": "Seance_Push",
+    "SÉANCE PULL": "Seance_Pull",
+    "SÉANCE FULL": "Seance_Full",
+}
+LIFESTYLE_PAGE = "Lifestyle"
+AUTO_PAGE = "Auto-Séance intelligente"
+# Dates des saisies du test : loin des données synthétiques, uniques par saisie
+LOAD_DATE0 = date(2031, 1, 1)
+# Version de Streamlit dont les internes sont remplacés ci-dessous
+STREAMLIT_VERSION = "1.66.0"
+
+if streamlit.__version__ != STREAMLIT_VERSION:
+    sys.exit(f"loadtest.py est écrit pour streamlit {STREAMLIT_VERSION} "
+             f"(installé : {streamlit.__version__}), voir requirements.txt")
+
+# AppTest crée un ScriptCache par run : le script serait recompilé à chaque run
+# de chaque thread, et des compile() concurrents font planter CPython 3.11
+# (« AST constructor recursion depth mismatch »). Un seul cache pour tous les
+# utilisateurs, comme un serveur : compilé une fois, sous le verrou du cache.
+_SCRIPT_CACHE = ScriptCache()
+local_script_runner.ScriptCache = lambda: _SCRIPT_CACHE
+# Création des AppTest sérialisée (lecture et préparation du script)
+_CREATE_LOCK = threading.Lock()
+
+# Chaque AppTest.run installe un Runtime simulé global puis le remet à None en
+# sortant : un utilisateur qui termine son run retirait le Runtime sous le
+# script d'un autre (« Runtime hasn't been created! », run vide). On garde le
+# dernier Runtime installé tant qu'aucun autre ne l'a remplacé.
+_LAST_RUNTIME = [None]
+
+
+def _runtime_instance(cls):
+    runtime = cls._instance if cls._instance is not None else _LAST_RUNTIME[0]
+    if runtime is None:
+        raise RuntimeError("Runtime hasn't been created!")
+    _LAST_RUNTIME[0] = runtime
+    return runtime
+
+
+def _runtime_exists(cls):
+    return cls._instance is not None or _LAST_RUNTIME[0] is not None
+
+
+Runtime.instance = classmethod(_runtime_instance)
+Runtime.exists = classmethod(_runtime_exists)
+
+# Même chose pour l'option global.appTest, posée par chaque run via un
+# patch.object de config.get_option : les sorties croisées de deux runs
+# restauraient l'original sous le script d'un troisième, dont les widgets
+# n'étaient plus enregistrés pour le test (KeyError sur l'id du widget).
+# Tout le process est un test : l'option est posée une fois pour toutes.
+config.set_option("global.appTest", True)
+app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+
+# ======================
+# DONNÉES SYNTHÉTIQUES
+# ======================
+
+def _column(ws, header):
+    """N° de colonne de l'en-tête `header`, ajouté en fin de ligne 1 si absent."""
+    headers = [c.value for c in ws[1]]
+    if header in headers:
+        return headers.index(header) + 1
+    col = max(i + 1 for i, h in enumerate(headers) if h not in (None, "")) + 1
+    ws.cell(row=1, column=col).value = header
+    return col
+
+
+def make_data(workdir, n_sessions, seed=0):
+    """Copie le modèle en DATA_FILE et le remplit : n_sessions séances datées par
+    feuille Seance_* (quelques exercices en kg x reps) et autant de Lifestyle.
+    """
+    rng = random.Random(seed)
+    wb = load_workbook(workdir / TEMPLATE_FILE)
+    day0 = datetime(2024, 1, 1)
+    for sheet in SESSION_PAGES.values():
+        ws = wb[sheet]
+        date_col = _column(ws, "Date")
+        headers = {c.value: c.column for c in ws[1] if c.value}
+        exercises = [h[:-5] for h in headers if h.endswith(" (kg)")][:6]
+        for i in range(n_sessions):
+            row = i + 2
+            ws.cell(row=row, column=1).value = i + 1
+            ws.cell(row=row, column=date_col).value = day0 + timedelta(days=2 * i)
+            for ex in rng.sample(exercises, min(3, len(exercises))):
+                ws.cell(row=row, column=headers[f"{ex} (kg)"]).value = round(rng.uniform(20, 150), 1)
+                if f"{ex} (reps)" in headers:
+                    ws.cell(row=row, column=headers[f"{ex} (reps)"]).value = rng.randint(3, 12)
+    ws = wb["Lifestyle"]
+    date_col = _column(ws, "Date")
+    for i in range(n_sessions):
+        row = i + 2
+        scores = [rng.randint(3, 9) for _ in range(7)]
+        ws.cell(row=row, column=1).value = i + 1
+        for col, score in enumerate(scores, start=2):
+            ws.cell(row=row, column=col).value = score
+        ws.cell(row=row, column=9).value = round(sum(scores) / 7 * 10)
+        ws.cell(row=row, column=date_col).value = day0 + timedelta(days=i)
+    wb.save(workdir / DATA_FILE)
+
+
+# ======================
+# UTILISATEURS VIRTUELS
+# ======================
+
+class Recorder:
+    """Latences, erreurs et écritures confirmées, partagées entre les threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.failures = []
+        self.crashed = []
+        self.writes = []
+
+    def timed_run(self, label, call):
+        t0 = time.perf_counter()
+        at = call()
+        elapsed = time.perf_counter() - t0
+        with self.lock:
+            self.latencies.setdefault(label, []).append(elapsed)
+            if at.exception:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return at
+
+    def fail(self, label, exc):
+        """Action interrompue par une exception côté test (pas dans l'app)."""
+        with self.lock:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            self.failures.append(f"{label} : {type(exc).__name__}: {exc}")
+
+    def crash(self, user, exc):
+        with self.lock:
+            self.crashed.append(f"user-{user} : {type(exc).__name__}: {exc}")
+
+    def confirm(self, write):
+        with self.lock:
+            self.writes.append(write)
+
+
+def _button(at, prefix):
+    return next(b for b in at.button if b.label.startswith(prefix))
+
+
+def run_user(user, app_path, n_actions, rec, counter, seed):
+    """Un utilisateur : n_actions pages visitées au hasard, avec saisie ou
+    génération sur les pages qui en ont une. Une action qui lève est comptée
+    en erreur et l'utilisateur passe à la suivante.
+    """
+    rng = random.Random(seed * 1000 + user)
+    with _CREATE_LOCK:
+        at = AppTest.from_file(str(app_path), default_timeout=300)
+    try:
+        at = rec.timed_run("(démarrage)", at.run)
+        pages = list(at.sidebar.radio[0].options)
+    except Exception as e:
+        rec.fail("(démarrage)", e)
+        return
+    for _ in range(n_actions):
+        page = rng.choice(pages)
+        label = f"{page} [affichage]"
+        try:
+            at = rec.timed_run(label, at.sidebar.radio[0].set_value(page).run)
+            if at.exception:
+                continue
+            if page == LIFESTYLE_PAGE:
+                label = f"{page} [enregistrer]"
+                day = LOAD_DATE0 + timedelta(days=next(counter))
+                at.date_input[0].set_value(day)
+                at = rec.timed_run(label, _button(at, "💾").click().run)
+                if any("enregistré" in s.value for s in at.success):
+                    rec.confirm(("Lifestyle", day))
+            elif page in SESSION_PAGES:
+                label = f"{page} [enregistrer]"
+                session = 100000 + next(counter)
+                at = at.number_input[0].set_value(session).run()
+                sheet = SESSION_PAGES[page]
+                kg_inputs = [t for t in at.text_input if t.key.endswith("_kg")]
+                if not kg_inputs:
+                    continue
+                field = rng.choice(kg_inputs)
+                kg = float(rng.randint(20, 150))
+                field.set_value(str(kg))
+                at = rec.timed_run(label, _button(at, "💾").click().run)
+                exercise = field.key[len(f"{sheet}_{session}_"):-len("_kg")]
+                if any("enregistrée" in s.value for s in at.success):
+                    rec.confirm((sheet, session, f"{exercise} (kg)", kg))
+            elif page == AUTO_PAGE:
+                label = f"{page} [générer]"
+                at = rec.timed_run(label, _button(at, "⚡").click().run)
+        except Exception as e:
+            rec.fail(label, e)
+
+
+def run_user_guarded(user, app_path, n_actions, rec, counter, seed):
+    """Cible des threads : toute exception qui échapperait à run_user est
+    enregistrée (le thread ne meurt pas en silence).
+    """
+    try:
+        run_user(user, app_path, n_actions, rec, counter, seed)
+    except BaseException as e:
+        rec.crash(user, e)
+
+
+def lost_writes(data_path, writes):
+    """Écritures confirmées à l'utilisateur mais absentes du fichier final."""
+    wb = load_workbook(data_path, read_only=True)
+    try:
+        sheets = {}
+        for name in {w[0] for w in writes}:
+            rows = wb[name].iter_rows(values_only=True)
+            header = next(rows)
+            sheets[name] = (header, [r for r in rows])
+        lost = []
+        for w in writes:
+            header, rows = sheets[w[0]]
+            if w[0] == "Lifestyle":
+                col = header.index("Date")
+                found = any(isinstance(r[col], datetime) and r[col].date() == w[1] for r in rows)
+            else:
+                _, session, column, value = w
+                col = header.index(column)
+                found = any(r[0] == session and r[col] == value for r in rows)
+            if not found:
+                lost.append(w)
+        return lost
+    finally:
+        wb.close()
+
+
+# ======================
+# RAPPORT
+# ======================
+
+def percentile(values, q):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def report(rec, lost, wall, users):
+    rows = []
+    for label, values in sorted(rec.latencies.items()):
+        rows.append({
+            "page": label,
+            "n": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000),
+            "p95_ms": round(percentile(values, 0.95) * 1000),
+            "p99_ms": round(percentile(values, 0.99) * 1000),
+            "max_ms": round(max(values) * 1000),
+            "erreurs": rec.errors.get(label, 0),
+        })
+    total = sum(r["n"] for r in rows)
+    return {
+        "utilisateurs": users,
+        "durée_s": round(wall, 2),
+        "requêtes": total,
+        "débit_req_s": round(total / wall, 2) if wall else None,
+        "erreurs": sum(rec.errors.values()),
+        "écritures_confirmées": len(rec.writes),
+        "écritures_perdues": len(lost),
+        "utilisateurs_interrompus": len(rec.crashed),
+        "pages": rows,
+        "échecs": rec.failures + rec.crashed,
+    }
+
+
+def print_report(result):
+    cols = ("page", "n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "erreurs")
+    width = max((len(r["page"]) for r in result["pages"]), default=4)
+    print(f"{cols[0]:<{width}}  " + "  ".join(f"{c:>8}" for c in cols[1:]))
+    for r in result["pages"]:
+        print(f"{r['page']:<{width}}  " + "  ".join(f"{r[c]:>8}" for c in cols[1:]))
+    print()
+    for key in ("utilisateurs", "durée_s", "requêtes", "débit_req_s", "erreurs",
+                "écritures_confirmées", "écritures_perdues",
+                "utilisateurs_interrompus"):
+        print(f"{key} : {result[key]}")
+    for failure in result["échecs"]:
+        print(f"  ✗ {failure}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=4, help="utilisateurs simultanés")
+    parser.add_argument("--actions", type=int, default=15, help="pages visitées par utilisateur")
+    parser.add_argument("--sessions", type=int, default=200, help="séances synthétiques par feuille")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="écrit aussi le rapport JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="empereur-load-"))
+    for name in APP_FILES:
+        shutil.copy(APP_DIR / name, workdir / name)
+    make_data(workdir, args.sessions, args.seed)
+    os.chdir(workdir)  # l'app utilise des chemins relatifs
+
+    rec = Recorder()
+    shared = itertools.count()  # next() est atomique : numéros/dates uniques entre threads
+    threads = [threading.Thread(target=run_user_guarded,
+                                args=(u, workdir / "app.py", args.actions, rec, shared, args.seed),
+                                name=f"user-{u}")
+               for u in range(args.users)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    result = report(rec, lost_writes(workdir / DATA_FILE, rec.writes), wall, args.users)
+    print_report(result)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    shutil.rmtree(workdir, ignore_errors=True)
+    failed = result["écritures_perdues"] or result["erreurs"] or result["utilisateurs_interrompus"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())